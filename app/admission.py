@@ -0,0 +1,159 @@
+import asyncio
+import itertools
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+
+from .config import AdmissionRoute, get_settings
+
+settings = get_settings()
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "route", "future")
+
+    def __init__(self, priority: int, seq: int, route: str, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.route = route
+        self.future = future
+
+    def sort_key(self):
+        return (-self.priority, self.seq)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        routes: Dict[str, AdmissionRoute] = settings.admission_routes,
+        max_concurrency: int = settings.admission_max_concurrency,
+        max_queue: int = settings.admission_max_queue,
+        queue_timeout: float = settings.admission_queue_timeout_ms / 1000,
+    ):
+        self.routes = routes
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._route_in_flight: Counter = Counter()
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(lambda: {
+            "admitted": 0,
+            "shed_queue_full": 0,
+            "shed_timeout": 0,
+            "queue_time_ms_total": 0.0,
+            "queue_time_ms_max": 0.0,
+        })
+
+    async def acquire(self, route: str) -> bool:
+        if not self._waiters and self._can_run(route):
+            self._grant(route)
+            self._record_admitted(route, 0.0)
+            return True
+
+        stats = self._stats[route]
+        if len(self._waiters) >= self.max_queue:
+            stats["shed_queue_full"] += 1
+            return False
+
+        waiter = _Waiter(self.routes[route].priority, next(self._seq), route, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self._wake()
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            stats["shed_timeout"] += 1
+            return False
+        except BaseException:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.future.done() and not waiter.future.cancelled():
+                self.release(route)
+            raise
+        self._record_admitted(route, time.monotonic() - started)
+        return True
+
+    def release(self, route: str) -> None:
+        self._in_flight -= 1
+        self._route_in_flight[route] -= 1
+        self._wake()
+
+    def metrics(self) -> Dict:
+        return {
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "routes": {route: dict(stats) for route, stats in self._stats.items()},
+        }
+
+    def _can_run(self, route: str) -> bool:
+        if self._in_flight >= self.max_concurrency:
+            return False
+        limit = self.routes[route].max_concurrency
+        return limit is None or self._route_in_flight[route] < limit
+
+    def _grant(self, route: str) -> None:
+        self._in_flight += 1
+        self._route_in_flight[route] += 1
+
+    def _wake(self) -> None:
+        self._waiters = [waiter for waiter in self._waiters if not waiter.future.done()]
+        while self._waiters and self._in_flight < self.max_concurrency:
+            waiter: Optional[_Waiter] = None
+            for candidate in sorted(self._waiters, key=_Waiter.sort_key):
+                if self._can_run(candidate.route):
+                    waiter = candidate
+                    break
+            if waiter is None:
+                return
+            self._waiters.remove(waiter)
+            self._grant(waiter.route)
+            waiter.future.set_result(None)
+
+    def _record_admitted(self, route: str, waited: float) -> None:
+        stats = self._stats[route]
+        stats["admitted"] += 1
+        stats["queue_time_ms_total"] += waited * 1000
+        stats["queue_time_ms_max"] = max(stats["queue_time_ms_max"], waited * 1000)
+
+
+class AdmissionMiddleware:
+    def __init__(
+        self,
+        app,
+        controller: Optional[AdmissionController] = None,
+        retry_after: int = settings.admission_retry_after_seconds,
+    ):
+        self.app = app
+        self.controller = controller or admission_controller
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        route = scope["path"] if scope["type"] == "http" else None
+        if route not in self.controller.routes or scope["method"] not in self.controller.routes[route].methods:
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.controller.acquire(route):
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry later"},
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route)
+
+
+admission_controller = AdmissionController()
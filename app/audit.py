@@ -0,0 +1,159 @@
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import case, insert, update
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .database import SessionLocal, group_by_user_shard
+from .models import AuthEvent, User
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class AuthEventQueue:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        max_size: int = settings.audit_queue_max_size,
+        batch_size: int = settings.audit_batch_size,
+        flush_interval: float = settings.audit_flush_interval_seconds,
+        full_policy: str = settings.audit_queue_full_policy,
+        block_timeout: float = settings.audit_block_timeout_seconds,
+    ):
+        self.session_factory = session_factory
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.full_policy = full_policy
+        self.block_timeout = block_timeout
+        self._events: deque = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._enqueued = 0
+        self._dropped = 0
+        self._flushed = 0
+        self._failed = 0
+        self._last_flush_at: Optional[datetime] = None
+
+    def record(
+        self,
+        user_id: int,
+        event_type: str,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+    ) -> bool:
+        event = {
+            "user_id": user_id,
+            "event_type": event_type,
+            "ip_address": ip_address,
+            "user_agent": user_agent[:255] if user_agent else None,
+            "created_at": datetime.now(timezone.utc),
+        }
+        with self._cond:
+            if len(self._events) >= self.max_size:
+                if self.full_policy == "block":
+                    self._cond.wait_for(lambda: len(self._events) < self.max_size, self.block_timeout)
+                if len(self._events) >= self.max_size:
+                    self._dropped += 1
+                    if self.full_policy != "drop_oldest":
+                        return False
+                    self._events.popleft()
+            self._events.append(event)
+            self._enqueued += 1
+            if len(self._events) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="auth-event-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def flush(self) -> int:
+        flushed = 0
+        while True:
+            with self._cond:
+                batch = [self._events.popleft() for _ in range(min(self.batch_size, len(self._events)))]
+                self._cond.notify_all()
+            if not batch:
+                return flushed
+            self._write(batch)
+            flushed += len(batch)
+
+    def metrics(self) -> Dict:
+        with self._cond:
+            depth = len(self._events)
+        return {
+            "depth": depth,
+            "max_size": self.max_size,
+            "full_policy": self.full_policy,
+            "enqueued": self._enqueued,
+            "dropped": self._dropped,
+            "flushed": self._flushed,
+            "failed": self._failed,
+            "last_flush_at": self._last_flush_at,
+        }
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._events) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                stopping = self._stopping
+            if stopping:
+                return
+            self.flush()
+
+    def _write(self, batch: List[Dict]) -> None:
+        try:
+            with self.session_factory() as db:
+                for bind_arguments, events in group_by_user_shard(db, batch):
+                    db.execute(insert(AuthEvent), events, bind_arguments=bind_arguments)
+                    last_logins = self._last_logins(events)
+                    if last_logins:
+                        db.execute(
+                            update(User.__table__)
+                            .where(User.id.in_(list(last_logins)))
+                            .values(
+                                last_login_at=case(last_logins, value=User.id),
+                                updated_at=User.__table__.c.updated_at
+                            ),
+                            bind_arguments=bind_arguments
+                        )
+                db.commit()
+        except Exception:
+            self._failed += len(batch)
+            logger.exception("Failed to flush %d auth events", len(batch))
+            return
+        self._flushed += len(batch)
+        self._last_flush_at = datetime.now(timezone.utc)
+
+    @staticmethod
+    def _last_logins(events: List[Dict]) -> Dict[int, datetime]:
+        last_logins: Dict[int, datetime] = {}
+        for event in events:
+            if event["event_type"] == "login":
+                current = last_logins.get(event["user_id"])
+                if current is None or event["created_at"] > current:
+                    last_logins[event["user_id"]] = event["created_at"]
+        return last_logins
+
+
+auth_events = AuthEventQueue()
@@ -1,11 +1,13 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import List, Optional
 
-from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
 from .config import get_settings
+from .database import is_sharded
+from .jwt_backends import TokenError, get_jwt_backend
+from .profiling import span
 from .models import User, RefreshToken
 from .schemas import TokenData
 import secrets
@@ -14,19 +16,23 @@ settings = get_settings()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    with span("hashing"):
+        return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    with span("hashing"):
+        return pwd_context.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=settings.access_token_expire_minutes))
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
+    return get_jwt_backend().encode(to_encode)
 
 def create_refresh_token(db: Session, user_id: int) -> str:
     token = secrets.token_urlsafe(32)
+    if is_sharded(db):
+        token = f"{db.shard_for_user(user_id)}.{token}"
     expires_at = datetime.now(timezone.utc) + timedelta(days=settings.refresh_token_expire_days)
     refresh_token = RefreshToken(
         user_id=user_id,
@@ -40,13 +46,13 @@ def create_refresh_token(db: Session, user_id: int) -> str:
 
 def verify_token(token: str, credentials_exception) -> TokenData:
     try:
-        payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
+        payload = get_jwt_backend().decode(token)
         user_id = payload.get("sub")
         username = payload.get("username")
         if user_id is None:
             raise credentials_exception
         return TokenData(user_id=user_id, username=username)
-    except JWTError:
+    except TokenError:
         raise credentials_exception
 
 def revoke_refresh_token(db: Session, token: str) -> bool:
@@ -57,6 +63,33 @@ def revoke_refresh_token(db: Session, token: str) -> bool:
         return True
     return False
 
+def revoke_user_refresh_tokens(db: Session, user_id: int) -> int:
+    return db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id,
+        RefreshToken.is_revoked == False
+    ).update({RefreshToken.is_revoked: True}, synchronize_session=False)
+
+def revoke_all_refresh_tokens(db: Session, user_id: int) -> int:
+    revoked = revoke_user_refresh_tokens(db, user_id)
+    db.commit()
+    return revoked
+
+def revoke_refresh_token_by_id(db: Session, user_id: int, session_id: int) -> bool:
+    revoked = db.query(RefreshToken).filter(
+        RefreshToken.id == session_id,
+        RefreshToken.user_id == user_id,
+        RefreshToken.is_revoked == False
+    ).update({RefreshToken.is_revoked: True}, synchronize_session=False)
+    db.commit()
+    return revoked > 0
+
+def get_active_refresh_tokens(db: Session, user_id: int) -> List[RefreshToken]:
+    return db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id,
+        RefreshToken.is_revoked == False,
+        RefreshToken.expires_at > datetime.now(timezone.utc)
+    ).order_by(RefreshToken.created_at.desc(), RefreshToken.id.desc()).all()
+
 def validate_refresh_token(db: Session, token: str) -> Optional[User]:
     refresh_token = db.query(RefreshToken).filter(
         RefreshToken.token == token,
@@ -0,0 +1,203 @@
+import argparse
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from functools import lru_cache
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+from .config import get_settings
+
+MAGIC = b"PWNB"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHQ")
+DEFAULT_PREFIX_BYTES = 8
+
+
+def password_digest(password: str) -> bytes:
+    return hashlib.sha1(password.encode("utf-8")).digest()
+
+
+class BreachedPasswords:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            raise ValueError(f"{path} is not a breached password file")
+        magic, version, self.prefix_bytes, _, self.count = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a breached password file")
+        if len(self._mmap) != HEADER.size + self.count * self.prefix_bytes:
+            raise ValueError(f"{path} is truncated")
+        if hasattr(mmap, "MADV_RANDOM"):
+            self._mmap.madvise(mmap.MADV_RANDOM)
+
+    def contains_digest(self, digest: bytes) -> bool:
+        width = self.prefix_bytes
+        key = digest[:width]
+        data = self._mmap
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * width
+            record = data[offset:offset + width]
+            if record < key:
+                low = middle + 1
+            elif record > key:
+                high = middle
+            else:
+                return True
+        return False
+
+    def __contains__(self, password: str) -> bool:
+        return self.contains_digest(password_digest(password))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        self._mmap.close()
+
+
+@lru_cache()
+def get_breached_passwords() -> Optional[BreachedPasswords]:
+    path = get_settings().breached_passwords_file
+    return BreachedPasswords(path) if path else None
+
+
+def is_breached_password(password: str) -> bool:
+    breached = get_breached_passwords()
+    return breached is not None and password in breached
+
+
+def parse_corpus(lines: Iterable[str], plaintext: bool) -> Iterator[bytes]:
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if plaintext:
+            if line:
+                yield password_digest(line)
+            continue
+        value = line.split(":", 1)[0].strip()
+        if len(value) != 40:
+            continue
+        try:
+            yield bytes.fromhex(value)
+        except ValueError:
+            continue
+
+
+def _write_run(directory: str, records: List[bytes]) -> str:
+    records.sort()
+    fd, path = tempfile.mkstemp(dir=directory, suffix=".run")
+    with os.fdopen(fd, "wb") as f:
+        f.write(b"".join(records))
+    return path
+
+
+def _read_run(f: BinaryIO, width: int, buffer_records: int = 65536) -> Iterator[bytes]:
+    while True:
+        block = f.read(width * buffer_records)
+        if not block:
+            return
+        for offset in range(0, len(block), width):
+            yield block[offset:offset + width]
+
+
+def compile_corpus(
+    digests: Iterable[bytes],
+    output: str,
+    prefix_bytes: int = DEFAULT_PREFIX_BYTES,
+    run_size: int = 10_000_000,
+    tmp_dir: Optional[str] = None,
+) -> int:
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as directory:
+        runs: List[str] = []
+        records: List[bytes] = []
+        for digest in digests:
+            records.append(digest[:prefix_bytes])
+            if len(records) >= run_size:
+                runs.append(_write_run(directory, records))
+                records = []
+        if records or not runs:
+            runs.append(_write_run(directory, records))
+
+        count = 0
+        partial = output + ".tmp"
+        files = [open(path, "rb") for path in runs]
+        try:
+            with open(partial, "wb") as out:
+                out.write(HEADER.pack(MAGIC, VERSION, prefix_bytes, 0, 0))
+                previous = None
+                pending: List[bytes] = []
+                for record in heapq.merge(*(_read_run(f, prefix_bytes) for f in files)):
+                    if record == previous:
+                        continue
+                    previous = record
+                    pending.append(record)
+                    count += 1
+                    if len(pending) >= 65536:
+                        out.write(b"".join(pending))
+                        pending = []
+                out.write(b"".join(pending))
+                out.seek(0)
+                out.write(HEADER.pack(MAGIC, VERSION, prefix_bytes, 0, count))
+        finally:
+            for f in files:
+                f.close()
+        os.replace(partial, output)
+    return count
+
+
+def _lines(paths: List[str]) -> Iterator[str]:
+    for path in paths:
+        if path == "-":
+            yield from sys.stdin
+            continue
+        with open(path, encoding="utf-8", errors="replace") as f:
+            yield from f
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compile and query the local breached password file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = commands.add_parser("compile", help="build a sorted SHA-1 prefix file from a breach corpus")
+    compile_parser.add_argument("inputs", nargs="+", help="corpus files of SHA1[:count] lines, or - for stdin")
+    compile_parser.add_argument("-o", "--output", required=True)
+    compile_parser.add_argument("--plaintext", action="store_true", help="inputs contain one password per line")
+    compile_parser.add_argument("--prefix-bytes", type=int, default=DEFAULT_PREFIX_BYTES, choices=range(4, 21))
+    compile_parser.add_argument("--run-size", type=int, default=10_000_000, help="records sorted in memory per run")
+    compile_parser.add_argument("--tmp-dir", default=None)
+
+    check_parser = commands.add_parser("check", help="look up passwords in a compiled file")
+    check_parser.add_argument("passwords", nargs="+")
+    check_parser.add_argument("-f", "--file", default=get_settings().breached_passwords_file)
+
+    args = parser.parse_args()
+    if args.command == "compile":
+        count = compile_corpus(
+            parse_corpus(_lines(args.inputs), args.plaintext),
+            args.output,
+            prefix_bytes=args.prefix_bytes,
+            run_size=args.run_size,
+            tmp_dir=args.tmp_dir,
+        )
+        print(f"Wrote {count} unique entries to {args.output}")
+        return 0
+
+    if not args.file:
+        parser.error("no file given and BREACHED_PASSWORDS_FILE is not set")
+    breached = BreachedPasswords(args.file)
+    found = False
+    for password in args.passwords:
+        hit = password in breached
+        found = found or hit
+        print(f"{password}: {'breached' if hit else 'not found'}")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
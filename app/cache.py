@@ -0,0 +1,195 @@
+import logging
+import select
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .database import all_user_bind_arguments, user_bind_arguments
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+INVALIDATION_CHANNEL = "user_invalidation"
+
+
+class UserCache:
+    def __init__(
+        self,
+        ttl: float = settings.user_cache_ttl_seconds,
+        max_staleness: float = settings.user_cache_max_staleness_seconds,
+        max_size: int = settings.user_cache_max_size,
+    ):
+        self.ttl = ttl
+        self.max_staleness = max_staleness
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._listeners: Set[Hashable] = set()
+        self._disconnected: Dict[Hashable, float] = {}
+        self._created_at = time.monotonic()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, user_id: int) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                stored_at, value = entry
+                connected = self._is_connected()
+                trusted_since = stored_at if connected else max(stored_at, self._disconnected_since())
+                if now - stored_at <= self.ttl and (connected or now - trusted_since <= self.max_staleness):
+                    self._entries.move_to_end(user_id)
+                    self._hits += 1
+                    return value
+                del self._entries[user_id]
+            self._misses += 1
+        return None
+
+    def set(self, user_id: int, value: Any) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), value)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def mark_connected(self, listener: Hashable) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._listeners.add(listener)
+            self._disconnected.pop(listener, None)
+
+    def mark_disconnected(self, listener: Hashable) -> None:
+        with self._lock:
+            self._listeners.add(listener)
+            self._disconnected.setdefault(listener, time.monotonic())
+
+    def _is_connected(self) -> bool:
+        return bool(self._listeners) and not self._disconnected
+
+    def _disconnected_since(self) -> float:
+        return min(self._disconnected.values(), default=self._created_at)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "listener_connected": self._is_connected(),
+                "listeners_disconnected": len(self._disconnected),
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalidations": self._invalidations,
+            }
+
+
+class InvalidationListener:
+    def __init__(self, engine: Engine, cache: UserCache, reconnect_delay: float = 1.0):
+        self.engine = engine
+        self.cache = cache
+        self.reconnect_delay = reconnect_delay
+        self.key = engine.url.render_as_string(hide_password=True)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self.cache.mark_disconnected(self.key)
+        self._thread = threading.Thread(target=self._run, name="user-invalidation-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.cache.mark_disconnected(self.key)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.warning("User invalidation listener disconnected", exc_info=True)
+            self.cache.mark_disconnected(self.key)
+            self._stop.wait(self.reconnect_delay)
+
+    def _listen(self) -> None:
+        connection = self.engine.raw_connection()
+        try:
+            dbapi_connection = connection.dbapi_connection
+            dbapi_connection.rollback()
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+            self.cache.mark_connected(self.key)
+            while not self._stop.is_set():
+                if select.select([dbapi_connection], [], [], 1.0) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    self._handle(dbapi_connection.notifies.pop(0).payload)
+        finally:
+            connection.invalidate()
+
+    def _handle(self, payload: str) -> None:
+        kind, _, value = payload.partition(":")
+        if kind == "user" and value.isdigit():
+            self.cache.invalidate(int(value))
+        else:
+            self.cache.clear()
+
+
+def publish_user_invalidation(db: Session, user_id: int) -> None:
+    if not user_cache.enabled:
+        return
+    user_cache.invalidate(user_id)
+    bind_arguments = user_bind_arguments(db, user_id)
+    if db.get_bind(**bind_arguments).dialect.name == "postgresql":
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": INVALIDATION_CHANNEL, "payload": f"user:{user_id}"},
+            bind_arguments=bind_arguments
+        )
+
+
+def publish_all_users_invalidation(db: Session) -> None:
+    if not user_cache.enabled:
+        return
+    user_cache.clear()
+    for bind_arguments in all_user_bind_arguments(db):
+        if db.get_bind(**bind_arguments).dialect.name == "postgresql":
+            db.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": INVALIDATION_CHANNEL, "payload": "user:*"},
+                bind_arguments=bind_arguments
+            )
+
+
+user_cache = UserCache()
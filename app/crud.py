@@ -1,20 +1,61 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from operator import attrgetter
+from sqlalchemy.ext.horizontal_shard import set_shard_id
+from sqlalchemy.orm import Query, Session
+from sqlalchemy import and_, delete, func, or_, select, update
 from typing import Optional, List
-from .models import User
-from .schemas import UserCreate, UserUpdate
-from .auth import get_password_hash
+from .config import get_settings
+from .database import is_sharded
+from .models import User, RefreshToken, UserDirectory
+from .principal import Principal
+from .schemas import UserCreate, UserUpdate, UserFilter
+from .auth import get_password_hash, revoke_user_refresh_tokens
+from .cache import user_cache, publish_user_invalidation, publish_all_users_invalidation
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
 
 def get_user(db: Session, user_id: int) -> Optional[User]:
     return db.query(User).filter(User.id == user_id).first()
 
+def get_principal(db: Session, user_id: int) -> Optional[Principal]:
+    row = db.query(User.id, User.username, User.is_active, User.is_admin).filter(User.id == user_id).first()
+    return Principal(*row) if row else None
+
+def get_cached_principal(db: Session, user_id: int) -> Optional[Principal]:
+    principal = user_cache.get(user_id)
+    if principal is None:
+        principal = get_principal(db, user_id)
+        if principal is not None:
+            user_cache.set(user_id, principal)
+    return principal
+
+def _get_user_from_directory(db: Session, criterion, *filters) -> Optional[User]:
+    entry = db.query(UserDirectory.id).filter(criterion).first()
+    if entry is None:
+        return None
+    return db.query(User).filter(User.id == entry.id, *filters).first()
+
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
+    if is_sharded(db):
+        return _get_user_from_directory(db, UserDirectory.email == email)
     return db.query(User).filter(User.email == email).first()
 
 def get_user_by_username(db: Session, username: str) -> Optional[User]:
+    if is_sharded(db):
+        return _get_user_from_directory(db, UserDirectory.username == username)
     return db.query(User).filter(User.username == username).first()
 
 def get_user_by_credentials(db: Session, username: str) -> Optional[User]:
+    if is_sharded(db):
+        return _get_user_from_directory(
+            db,
+            (UserDirectory.username == username) | (UserDirectory.email == username),
+            User.is_active == True
+        )
     return db.query(User).filter(
         and_(
             (User.username == username) | (User.email == username),
@@ -22,8 +63,87 @@ def get_user_by_credentials(db: Session, username: str) -> Optional[User]:
         )
     ).first()
 
+def _paginate_users(db: Session, query: Query, skip: int, limit: int) -> List[User]:
+    query = query.order_by(User.id)
+    if not is_sharded(db):
+        return query.offset(skip).limit(limit).all()
+    pages = [query.options(set_shard_id(shard)).limit(skip + limit).all() for shard in db.user_shards]
+    return list(islice(heapq.merge(*pages, key=attrgetter("id")), skip, skip + limit))
+
 def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
-    return db.query(User).offset(skip).limit(limit).all()
+    return _paginate_users(db, db.query(User), skip, limit)
+
+def _like_pattern(value: str, match: str) -> str:
+    escaped = value.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%" if match == "prefix" else f"%{escaped}%"
+
+def filter_users(query, filters: UserFilter):
+    if filters.q:
+        pattern = _like_pattern(filters.q, filters.match)
+        query = query.filter(or_(
+            func.lower(User.username).like(pattern, escape="\\"),
+            func.lower(User.email).like(pattern, escape="\\"),
+            func.lower(User.full_name).like(pattern, escape="\\")
+        ))
+    if filters.is_active is not None:
+        query = query.filter(User.is_active == filters.is_active)
+    if filters.is_admin is not None:
+        query = query.filter(User.is_admin == filters.is_admin)
+    if filters.created_from is not None:
+        query = query.filter(User.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        query = query.filter(User.created_at < filters.created_to)
+    return query
+
+def search_users(db: Session, filters: UserFilter, skip: int = 0, limit: int = 100) -> List[User]:
+    return _paginate_users(db, filter_users(db.query(User), filters), skip, limit)
+
+def _release_orphaned_entries(db: Session, criterion) -> None:
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.directory_pending_grace_seconds)
+    settled = or_(UserDirectory.pending_since.is_(None), UserDirectory.pending_since < cutoff)
+    entry_ids = [entry.id for entry in db.query(UserDirectory.id).filter(criterion, settled)]
+    if not entry_ids:
+        return
+    live = {row.id for row in db.query(User.id).filter(User.id.in_(entry_ids))}
+    orphaned = [entry_id for entry_id in entry_ids if entry_id not in live]
+    if orphaned:
+        db.execute(delete(UserDirectory).where(UserDirectory.id.in_(orphaned)))
+
+def _repair_directory(db: Session, user_ids: List[int], discard: bool = False) -> None:
+    try:
+        if discard:
+            db.execute(delete(User).where(User.id.in_(user_ids)))
+        users = {user.id: user for user in db.query(User).filter(User.id.in_(user_ids))}
+        entries = {entry.id: entry for entry in db.query(UserDirectory).filter(UserDirectory.id.in_(user_ids))}
+        for user_id in user_ids:
+            db_user, entry = users.get(user_id), entries.get(user_id)
+            if db_user is None and entry is not None:
+                db.delete(entry)
+            elif db_user is not None and entry is None:
+                db.add(UserDirectory(id=db_user.id, email=db_user.email, username=db_user.username))
+            elif db_user is not None:
+                entry.email, entry.username = db_user.email, db_user.username
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Failed to repair user directory entries for %s", user_ids)
+
+def _confirm_directory_entry(db: Session, user_id: int) -> None:
+    try:
+        db.query(UserDirectory).filter(UserDirectory.id == user_id).update({UserDirectory.pending_since: None})
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Failed to confirm user directory entry %s", user_id)
+
+def _commit_directory_write(db: Session, user_ids: List[int], discard: bool = False) -> None:
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        if is_sharded(db) and user_ids:
+            _repair_directory(db, user_ids, discard)
+        raise
 
 def create_user(db: Session, user: UserCreate) -> User:
     hashed_password = get_password_hash(user.password)
@@ -33,8 +153,16 @@ def create_user(db: Session, user: UserCreate) -> User:
         hashed_password=hashed_password,
         full_name=user.full_name
     )
+    if is_sharded(db):
+        _release_orphaned_entries(db, (UserDirectory.username == user.username) | (UserDirectory.email == user.email))
+        entry = UserDirectory(email=user.email, username=user.username, pending_since=datetime.now(timezone.utc))
+        db.add(entry)
+        db.flush()
+        db_user.id = entry.id
     db.add(db_user)
-    db.commit()
+    _commit_directory_write(db, [db_user.id], discard=True)
+    if is_sharded(db):
+        _confirm_directory_entry(db, db_user.id)
     db.refresh(db_user)
     return db_user
 
@@ -45,14 +173,73 @@ def update_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[
     update_data = user_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_user, field, value)
-    db.commit()
+    if is_sharded(db) and "email" in update_data:
+        _release_orphaned_entries(db, and_(UserDirectory.email == db_user.email, UserDirectory.id != user_id))
+        db.query(UserDirectory).filter(UserDirectory.id == user_id).update({UserDirectory.email: db_user.email})
+    publish_user_invalidation(db, user_id)
+    _commit_directory_write(db, [user_id])
     db.refresh(db_user)
     return db_user
 
+def change_user_password(db: Session, db_user: User, new_password: str) -> int:
+    db_user.hashed_password = get_password_hash(new_password)
+    revoked = revoke_user_refresh_tokens(db, db_user.id)
+    db.commit()
+    return revoked
+
 def delete_user(db: Session, user_id: int) -> bool:
     db_user = db.query(User).filter(User.id == user_id).first()
     if not db_user:
         return False
+    revoke_user_refresh_tokens(db, user_id)
     db.delete(db_user)
-    db.commit()
+    if is_sharded(db):
+        db.query(UserDirectory).filter(UserDirectory.id == user_id).delete()
+    publish_user_invalidation(db, user_id)
+    _commit_directory_write(db, [user_id])
     return True
+
+BULK_USER_UPDATES = {
+    "activate": {"is_active": True},
+    "deactivate": {"is_active": False},
+    "set_admin": {"is_admin": True},
+    "unset_admin": {"is_admin": False},
+}
+
+def bulk_update_users(
+    db: Session,
+    action: str,
+    caller_id: int,
+    user_ids: Optional[List[int]] = None,
+    filters: Optional[UserFilter] = None
+) -> List[int]:
+    criteria = [User.id != caller_id]
+    if user_ids is not None:
+        criteria.append(User.id.in_(user_ids))
+
+    def _target(statement):
+        if filters is not None:
+            statement = filter_users(statement, filters)
+        return statement.where(*criteria)
+
+    if action in ("deactivate", "delete"):
+        db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.user_id.in_(_target(select(User.id))), RefreshToken.is_revoked == False)
+            .values(is_revoked=True),
+            execution_options={"synchronize_session": False}
+        )
+
+    if action == "delete":
+        statement = _target(delete(User))
+    else:
+        statement = _target(update(User)).values(**BULK_USER_UPDATES[action])
+    affected = db.execute(
+        statement.returning(User.id),
+        execution_options={"synchronize_session": False}
+    ).scalars().all()
+    if is_sharded(db) and action == "delete" and affected:
+        db.execute(delete(UserDirectory).where(UserDirectory.id.in_(affected)))
+    publish_all_users_invalidation(db)
+    _commit_directory_write(db, affected if action == "delete" else [])
+    return affected
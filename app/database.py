@@ -1,20 +1,149 @@
-from sqlalchemy import create_engine
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import MetaData, create_engine, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.horizontal_shard import ShardedSession
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList, ColumnClause
 from .config import get_settings
 
 settings = get_settings()
 
-engine = create_engine(
-    settings.database_url,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    pool_size=10,
-    max_overflow=20
-)
+DIRECTORY_SHARD = "directory"
+USER_ID_COLUMNS = {("users", "id"), ("refresh_tokens", "user_id"), ("auth_events", "user_id")}
+
+
+def _create_engine(url: str) -> Engine:
+    return create_engine(
+        url,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout
+    )
+
+engine = _create_engine(settings.database_url)
+shard_engines: Dict[str, Engine] = {
+    f"shard_{index}": _create_engine(url) for index, url in enumerate(settings.shard_urls)
+}
+user_engines: List[Engine] = list(shard_engines.values()) or [engine]
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+DirectoryBase = declarative_base()
+
+
+def _conjuncts(clause) -> Iterator:
+    if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+        for child in clause.clauses:
+            yield from _conjuncts(child)
+    elif clause is not None:
+        yield clause
+
+
+class UserShardedSession(ShardedSession):
+    def __init__(self, user_shards: List[str], **kwargs):
+        self.user_shards = user_shards
+        super().__init__(
+            shard_chooser=self._choose_shard,
+            identity_chooser=self._choose_identity_shards,
+            execute_chooser=self._choose_execute_shards,
+            **kwargs
+        )
+
+    def shard_for_user(self, user_id: int) -> str:
+        return self.user_shards[zlib.crc32(str(user_id).encode()) % len(self.user_shards)]
+
+    def shard_for_token(self, token: str) -> Optional[str]:
+        shard, _, _ = token.partition(".")
+        return shard if shard in self.user_shards else None
+
+    def _choose_shard(self, mapper, instance, clause=None, **kw) -> str:
+        table = mapper.local_table
+        if table.metadata is DirectoryBase.metadata:
+            return DIRECTORY_SHARD
+        user_id = getattr(instance, "id" if table.name == "users" else "user_id", None)
+        if user_id is None:
+            raise ValueError(f"Cannot choose a shard for {table.name} without a user id")
+        return self.shard_for_user(user_id)
+
+    def _choose_identity_shards(self, mapper, primary_key, **kw) -> List[str]:
+        table = mapper.local_table
+        if table.metadata is DirectoryBase.metadata:
+            return [DIRECTORY_SHARD]
+        if table.name == "users":
+            return [self.shard_for_user(primary_key[0])]
+        return self.user_shards
+
+    def _choose_execute_shards(self, context) -> List[str]:
+        mappers = [context.bind_mapper, *context.all_mappers] if context.is_orm_statement else []
+        if any(mapper is not None and mapper.local_table.metadata is DirectoryBase.metadata for mapper in mappers):
+            return [DIRECTORY_SHARD]
+
+        parameters = context.parameters if isinstance(context.parameters, dict) else {}
+        chosen = None
+        for clause in _conjuncts(getattr(context.statement, "whereclause", None)):
+            if not (
+                isinstance(clause, BinaryExpression)
+                and clause.operator in (operators.eq, operators.in_op)
+                and isinstance(clause.left, ColumnClause)
+                and isinstance(clause.right, BindParameter)
+                and clause.left.table is not None
+            ):
+                continue
+            key = (clause.left.table.name, clause.left.name)
+            value = parameters.get(clause.right.key, clause.right.effective_value)
+            values = value if clause.operator is operators.in_op else [value]
+            if key in USER_ID_COLUMNS:
+                shards = {self.shard_for_user(user_id) for user_id in values}
+            elif key == ("refresh_tokens", "token") and self.shard_for_token(value):
+                shards = {self.shard_for_token(value)}
+            else:
+                continue
+            chosen = shards if chosen is None else chosen & shards
+        if chosen is None:
+            return self.user_shards
+        return [shard for shard in self.user_shards if shard in chosen] or self.user_shards[:1]
+
+
+def create_sharded_sessionmaker(directory_engine: Engine, user_shard_engines: Dict[str, Engine]) -> sessionmaker:
+    return sessionmaker(
+        class_=UserShardedSession,
+        autocommit=False,
+        autoflush=False,
+        user_shards=list(user_shard_engines),
+        shards={DIRECTORY_SHARD: directory_engine, **user_shard_engines}
+    )
+
+
+def is_sharded(db) -> bool:
+    return isinstance(db, UserShardedSession)
+
+
+def user_bind_arguments(db, user_id: int) -> Dict:
+    return {"shard_id": db.shard_for_user(user_id)} if is_sharded(db) else {}
+
+
+def all_user_bind_arguments(db) -> List[Dict]:
+    return [{"shard_id": shard} for shard in db.user_shards] if is_sharded(db) else [{}]
+
+
+def group_by_user_shard(db, rows: List[Dict]) -> List[Tuple[Dict, List[Dict]]]:
+    if not is_sharded(db):
+        return [({}, rows)]
+    groups: Dict[str, List[Dict]] = {}
+    for row in rows:
+        groups.setdefault(db.shard_for_user(row["user_id"]), []).append(row)
+    return [({"shard_id": shard}, group) for shard, group in groups.items()]
+
+
+if shard_engines:
+    SessionLocal = create_sharded_sessionmaker(engine, shard_engines)
+else:
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
     db = SessionLocal()
@@ -23,5 +152,37 @@ def get_db():
     finally:
         db.close()
 
+def schema_targets() -> List[Tuple[Engine, MetaData]]:
+    if shard_engines:
+        return [(engine, DirectoryBase.metadata)] + [(shard_engine, Base.metadata) for shard_engine in shard_engines.values()]
+    return [(engine, Base.metadata)]
+
+def add_missing_columns(bind: Engine, metadata: MetaData) -> List[str]:
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    quote = bind.dialect.identifier_preparer.quote
+    statements = []
+    for table in metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable or column.server_default is not None:
+                raise RuntimeError(f"{table.name}.{column.name} must be added by hand: it is not a plain nullable column")
+            statements.append(
+                f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(dialect=bind.dialect)}"
+            )
+    if statements:
+        with bind.begin() as connection:
+            if bind.dialect.name == "postgresql":
+                connection.execute(text("SET LOCAL lock_timeout = '5s'"))
+            for statement in statements:
+                connection.execute(text(statement))
+    return statements
+
 def create_tables():
-    Base.metadata.create_all(bind=engine)
+    for bind, metadata in schema_targets():
+        metadata.create_all(bind=bind)
+        add_missing_columns(bind, metadata)
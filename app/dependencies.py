@@ -3,8 +3,9 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from .database import get_db
 from .auth import verify_token
-from .crud import get_user
+from .crud import get_cached_principal, get_user
 from .models import User
+from .principal import Principal
 
 security = HTTPBearer()
 
@@ -17,6 +18,16 @@ credentials_exception = HTTPException(
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
+) -> Principal:
+    token_data = verify_token(credentials.credentials, credentials_exception)
+    principal = get_cached_principal(db, user_id=token_data.user_id)
+    if principal is None or not principal.is_active:
+        raise credentials_exception
+    return principal
+
+def get_current_user_entity(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
 ) -> User:
     token_data = verify_token(credentials.credentials, credentials_exception)
     user = get_user(db, user_id=token_data.user_id)
@@ -24,7 +35,7 @@ def get_current_user(
         raise credentials_exception
     return user
 
-def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+def get_admin_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,95 @@
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Dict
+
+from .config import get_settings
+
+
+class TokenError(Exception):
+    pass
+
+
+class JWTBackend(ABC):
+    name = ""
+
+    def __init__(self, secret_key: str, algorithm: str):
+        self.algorithm = algorithm
+        self._key = self.prepare_key(secret_key)
+
+    def prepare_key(self, secret_key: str) -> Any:
+        return secret_key
+
+    @abstractmethod
+    def encode(self, claims: Dict[str, Any]) -> str:
+        ...
+
+    @abstractmethod
+    def decode(self, token: str) -> Dict[str, Any]:
+        ...
+
+
+class JoseBackend(JWTBackend):
+    name = "jose"
+
+    def __init__(self, secret_key: str, algorithm: str):
+        from jose import JWTError, jwk, jwt
+        self._jwt = jwt
+        self._error = JWTError
+        self._jwk = jwk
+        super().__init__(secret_key, algorithm)
+
+    def prepare_key(self, secret_key: str) -> Any:
+        return self._jwk.construct(secret_key, self.algorithm)
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        return self._jwt.encode(claims, self._key, algorithm=self.algorithm)
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        try:
+            return self._jwt.decode(token, self._key, algorithms=[self.algorithm])
+        except self._error as e:
+            raise TokenError(str(e)) from e
+
+
+class PyJWTBackend(JWTBackend):
+    name = "pyjwt"
+
+    def __init__(self, secret_key: str, algorithm: str):
+        try:
+            import jwt
+        except ImportError as e:
+            raise RuntimeError("JWT_BACKEND=pyjwt requires the PyJWT package") from e
+        self._jwt = jwt.PyJWT()
+        self._error = jwt.InvalidTokenError
+        self._algorithm_obj = jwt.get_algorithm_by_name(algorithm)
+        super().__init__(secret_key, algorithm)
+
+    def prepare_key(self, secret_key: str) -> Any:
+        return self._algorithm_obj.prepare_key(secret_key)
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        return self._jwt.encode(claims, self._key, algorithm=self.algorithm)
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        try:
+            return self._jwt.decode(token, self._key, algorithms=[self.algorithm])
+        except self._error as e:
+            raise TokenError(str(e)) from e
+
+
+JWT_BACKENDS = {
+    JoseBackend.name: JoseBackend,
+    PyJWTBackend.name: PyJWTBackend,
+}
+
+
+def create_jwt_backend(name: str, secret_key: str, algorithm: str) -> JWTBackend:
+    if name not in JWT_BACKENDS:
+        raise ValueError(f"Unknown JWT backend: {name}")
+    return JWT_BACKENDS[name](secret_key, algorithm)
+
+
+@lru_cache()
+def get_jwt_backend() -> JWTBackend:
+    settings = get_settings()
+    return create_jwt_backend(settings.jwt_backend, settings.jwt_secret_key, settings.jwt_algorithm)
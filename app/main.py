@@ -1,9 +1,13 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from .database import create_tables, get_db
+from .database import create_tables, get_db, user_engines
 from .routers import auth, users
 from .config import get_settings
+from .audit import auth_events
+from .cache import InvalidationListener, user_cache
+from .profiling import ProfiledRoute, ProfilingMiddleware
+from .admission import AdmissionMiddleware
 from contextlib import asynccontextmanager
 
 settings = get_settings()
@@ -11,7 +15,20 @@ settings = get_settings()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_tables()
+    auth_events.start()
+    listeners = []
+    if user_cache.enabled:
+        listeners = [
+            InvalidationListener(user_engine, user_cache)
+            for user_engine in user_engines
+            if user_engine.dialect.name == "postgresql"
+        ]
+    for listener in listeners:
+        listener.start()
     yield
+    for listener in listeners:
+        listener.stop()
+    auth_events.stop()
 
 app = FastAPI(
     title="Secure Authentication API",
@@ -21,6 +38,7 @@ app = FastAPI(
     redoc_url="/redoc",
     lifespan=lifespan
 )
+app.router.route_class = ProfiledRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,6 +48,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(AdmissionMiddleware)
+
 app.include_router(auth.router)
 app.include_router(users.router)
 
@@ -0,0 +1,66 @@
+import argparse
+import sys
+from typing import List
+
+from sqlalchemy import MetaData, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
+
+from . import models  # registers the tables on the metadata
+from .database import add_missing_columns, schema_targets
+
+
+def build_missing_indexes(bind: Engine, metadata: MetaData) -> List[str]:
+    if bind.dialect.name != "postgresql":
+        return []
+    statements = []
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        trigram = connection.execute(
+            text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        ).first() is not None
+        if trigram:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for table in metadata.sorted_tables:
+            existing = dict(connection.execute(text(
+                "SELECT c.relname, i.indisvalid FROM pg_index i "
+                "JOIN pg_class c ON c.oid = i.indexrelid "
+                "JOIN pg_class t ON t.oid = i.indrelid "
+                "WHERE t.relname = :table AND pg_table_is_visible(t.oid)"
+            ), {"table": table.name}).all())
+            if not existing:
+                continue
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if existing.get(index.name):
+                    continue
+                statement = str(CreateIndex(index).compile(dialect=bind.dialect))
+                if "gin_trgm_ops" in statement and not trigram:
+                    continue
+                if index.name in existing:
+                    drop = f"DROP INDEX CONCURRENTLY IF EXISTS {bind.dialect.identifier_preparer.quote(index.name)}"
+                    connection.execute(text(drop))
+                    statements.append(drop)
+                statement = statement.replace("INDEX", "INDEX CONCURRENTLY", 1)
+                connection.execute(text(statement))
+                statements.append(statement)
+    return statements
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Bring existing databases up to the current schema")
+    parser.add_argument(
+        "--skip-indexes", action="store_true", help="only add missing columns; build indexes in a later run"
+    )
+    args = parser.parse_args()
+    for bind, metadata in schema_targets():
+        label = bind.url.render_as_string(hide_password=True)
+        metadata.create_all(bind=bind)
+        for statement in add_missing_columns(bind, metadata):
+            print(f"{label}: {statement}")
+        if not args.skip_indexes:
+            for statement in build_missing_indexes(bind, metadata):
+                print(f"{label}: {statement}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Index, DDL, event, text
 from sqlalchemy.sql import func
-from .database import Base
+from .database import Base, DirectoryBase
+
+
+def _trigram_available(ddl, target, bind, **kw) -> bool:
+    if bind is None:
+        return True
+    return bind.execute(
+        text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).first() is not None
 
 class User(Base):
     __tablename__ = "users"
@@ -14,6 +22,26 @@ class User(Base):
     is_admin = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    last_login_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("ix_users_created_at", "created_at"),
+        Index("ix_users_username_lower", text("lower(username) text_pattern_ops")).ddl_if(dialect="postgresql"),
+        Index("ix_users_email_lower", text("lower(email) text_pattern_ops")).ddl_if(dialect="postgresql"),
+        Index("ix_users_full_name_lower", text("lower(full_name) text_pattern_ops")).ddl_if(dialect="postgresql"),
+        Index("ix_users_username_trgm", text("lower(username) gin_trgm_ops"), postgresql_using="gin")
+        .ddl_if(dialect="postgresql", callable_=_trigram_available),
+        Index("ix_users_email_trgm", text("lower(email) gin_trgm_ops"), postgresql_using="gin")
+        .ddl_if(dialect="postgresql", callable_=_trigram_available),
+        Index("ix_users_full_name_trgm", text("lower(full_name) gin_trgm_ops"), postgresql_using="gin")
+        .ddl_if(dialect="postgresql", callable_=_trigram_available),
+    )
+
+event.listen(
+    User.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql", callable_=_trigram_available)
+)
 
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
@@ -24,3 +52,21 @@ class RefreshToken(Base):
     expires_at = Column(DateTime(timezone=True), nullable=False)
     is_revoked = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AuthEvent(Base):
+    __tablename__ = "auth_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, index=True, nullable=False)
+    event_type = Column(String(20), nullable=False)
+    ip_address = Column(String(45))
+    user_agent = Column(String(255))
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+class UserDirectory(DirectoryBase):
+    __tablename__ = "user_directory"
+
+    id = Column(Integer, primary_key=True)
+    email = Column(String(255), unique=True, index=True, nullable=False)
+    username = Column(String(50), unique=True, index=True, nullable=False)
+    pending_since = Column(DateTime(timezone=True))
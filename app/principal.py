@@ -0,0 +1,26 @@
+class Principal:
+    __slots__ = ("id", "username", "is_active", "is_admin")
+
+    def __init__(self, id: int, username: str, is_active: bool, is_admin: bool):
+        object.__setattr__(self, "id", id)
+        object.__setattr__(self, "username", username)
+        object.__setattr__(self, "is_active", bool(is_active))
+        object.__setattr__(self, "is_admin", bool(is_admin))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Principal is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Principal is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, Principal):
+            return NotImplemented
+        return (self.id, self.username, self.is_active, self.is_admin) == \
+            (other.id, other.username, other.is_active, other.is_admin)
+
+    def __hash__(self):
+        return hash((self.id, self.username, self.is_active, self.is_admin))
+
+    def __repr__(self):
+        return f"Principal(id={self.id!r}, username={self.username!r}, is_active={self.is_active!r}, is_admin={self.is_admin!r})"
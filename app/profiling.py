@@ -0,0 +1,385 @@
+import asyncio
+import functools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+import anyio
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import get_settings
+from .jwt_backends import TokenError, get_jwt_backend
+
+settings = get_settings()
+
+PROFILE_HEADER = b"x-profile-token"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_SCOPE = "profile"
+
+_active_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("active_profile", default=None)
+_hooks_installed = False
+_hooks_lock = threading.Lock()
+
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, interval: float):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.started_at = datetime.now(timezone.utc)
+        self.duration = 0.0
+        self.samples: Counter = Counter()
+        self.span_time: Dict[str, float] = defaultdict(float)
+        self.span_count: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._start = 0.0
+
+    def start(self) -> None:
+        self._start = perf_counter()
+        sampler.add(self)
+
+    def stop(self) -> None:
+        sampler.remove(self)
+        self.duration = perf_counter() - self._start
+
+    def add_sample(self, stack: tuple) -> None:
+        with self._lock:
+            self.samples[stack] += 1
+
+    def add_span(self, kind: str, elapsed: float) -> None:
+        with self._lock:
+            self.span_time[kind] += elapsed
+            self.span_count[kind] += 1
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": sum(self.samples.values()),
+            "db_time_ms": round(self.span_time["db"] * 1000, 3),
+            "db_queries": self.span_count["db"],
+            "hashing_time_ms": round(self.span_time["hashing"] * 1000, 3),
+            "hashing_calls": self.span_count["hashing"],
+        }
+
+    def to_collapsed(self) -> str:
+        return "".join(
+            ";".join(f"{name} ({file}:{line})" for name, file, line in stack) + f" {count}\n"
+            for stack, count in self.samples.items()
+        )
+
+    def to_speedscope(self) -> Dict:
+        frames: List[Dict] = []
+        frame_index: Dict[tuple, int] = {}
+        samples: List[List[int]] = []
+        weights: List[float] = []
+        for stack, count in self.samples.items():
+            indexes = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    name, file, line = frame
+                    frames.append({"name": name, "file": file, "line": line})
+                indexes.append(frame_index[frame])
+            samples.append(indexes)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.method} {self.path}",
+            "exporter": "secure-auth-api",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": f"{self.method} {self.path}",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.duration,
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+
+
+class StackSampler:
+    def __init__(self):
+        self._profiles: Dict[str, RequestProfile] = {}
+        self._homes: Dict[str, int] = {}
+        self._owners: Dict[int, RequestProfile] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles[profile.id] = profile
+            self._homes[profile.id] = threading.get_ident()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles.pop(profile.id, None)
+            self._homes.pop(profile.id, None)
+            self._owners = {ident: owner for ident, owner in self._owners.items() if owner is not profile}
+
+    def attach(self, profile: Optional[RequestProfile]) -> None:
+        ident = threading.get_ident()
+        if self._owners.get(ident) is profile:
+            return
+        with self._lock:
+            if profile is not None and profile.id in self._profiles:
+                self._owners[ident] = profile
+            else:
+                self._owners.pop(ident, None)
+
+    def _run(self) -> None:
+        names: Dict[int, str] = {}
+        while True:
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                interval = min(profile.interval for profile in self._profiles.values())
+                targets: Dict[int, List[RequestProfile]] = defaultdict(list)
+                for profile_id, thread_id in self._homes.items():
+                    targets[thread_id].append(self._profiles[profile_id])
+                for thread_id, profile in self._owners.items():
+                    if profile not in targets[thread_id]:
+                        targets[thread_id].append(profile)
+            frames = sys._current_frames()
+            for thread_id, profiles in targets.items():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, os.path.basename(code.co_filename), frame.f_lineno))
+                    frame = frame.f_back
+                if not stack or (stack[0][1], stack[0][0]) in _IDLE_LEAVES:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append((names.get(thread_id, str(thread_id)), "<thread>", 0))
+                stack.reverse()
+                for profile in profiles:
+                    profile.add_sample(tuple(stack))
+            del frames
+            time.sleep(interval)
+
+
+sampler = StackSampler()
+
+
+_PROFILE_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class ProfileStore:
+    def __init__(
+        self,
+        directory: str = settings.profiling_dir,
+        max_artifacts: int = settings.profiling_max_artifacts,
+    ):
+        self.directory = directory
+        self.max_artifacts = max_artifacts
+
+    def add(self, profile: RequestProfile) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        artifact = {
+            "summary": profile.summary(),
+            "speedscope": profile.to_speedscope(),
+            "collapsed": profile.to_collapsed(),
+        }
+        path = self._path(profile.id)
+        with open(f"{path}.{os.getpid()}.tmp", "w") as f:
+            json.dump(artifact, f)
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
+        for stale in self._paths()[self.max_artifacts:]:
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        if not _PROFILE_ID.fullmatch(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def all(self) -> List[Dict]:
+        summaries = []
+        for path in self._paths():
+            try:
+                with open(path) as f:
+                    summaries.append(json.load(f)["summary"])
+            except (FileNotFoundError, ValueError):
+                continue
+        return summaries
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def _paths(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        paths = []
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                paths.append((os.stat(path).st_mtime_ns, path))
+            except FileNotFoundError:
+                continue
+        return [path for _, path in sorted(paths, reverse=True)]
+
+
+def bind_thread(endpoint):
+    if asyncio.iscoroutinefunction(endpoint) or getattr(endpoint, "__profiled__", False):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    def run_profiled(*args, **kwargs):
+        sampler.attach(_active_profile.get())
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            sampler.attach(None)
+
+    run_profiled.__profiled__ = True
+    return run_profiled
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, bind_thread(endpoint), **kwargs)
+
+
+@contextmanager
+def span(kind: str):
+    profile = _active_profile.get()
+    sampler.attach(profile)
+    if profile is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_span(kind, perf_counter() - start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active_profile.get()
+    sampler.attach(profile)
+    if profile is not None:
+        conn.info.setdefault("profile_query_start", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active_profile.get()
+    if profile is not None and conn.info.get("profile_query_start"):
+        profile.add_span("db", perf_counter() - conn.info["profile_query_start"].pop())
+
+
+def _install_hooks() -> None:
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        _hooks_installed = True
+
+
+def create_profile_token(user_id: int) -> str:
+    expire = datetime.now(timezone.utc) + timedelta(minutes=settings.profiling_token_expire_minutes)
+    return get_jwt_backend().encode({"profiler": str(user_id), "scope": PROFILE_SCOPE, "exp": expire})
+
+
+def verify_profile_token(token: str) -> bool:
+    try:
+        payload = get_jwt_backend().decode(token)
+    except TokenError:
+        return False
+    return payload.get("scope") == PROFILE_SCOPE
+
+
+class ProfilingMiddleware:
+    def __init__(
+        self,
+        app,
+        store: Optional[ProfileStore] = None,
+        sample_rate: float = settings.profiling_sample_rate,
+        interval: float = settings.profiling_interval_ms / 1000,
+    ):
+        self.app = app
+        self.store = store or profile_store
+        self.sample_rate = sample_rate
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._triggered(scope):
+            await self.app(scope, receive, send)
+            return
+
+        _install_hooks()
+        profile = RequestProfile(scope["method"], scope["path"], self.interval)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile.id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _active_profile.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.stop()
+            _active_profile.reset(token)
+            await anyio.to_thread.run_sync(self.store.add, profile)
+
+    def _triggered(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return verify_profile_token(value.decode("latin-1"))
+        query_string = scope.get("query_string", b"")
+        if PROFILE_QUERY_PARAM.encode() + b"=" in query_string:
+            tokens = parse_qs(query_string.decode("latin-1")).get(PROFILE_QUERY_PARAM)
+            if tokens:
+                return verify_profile_token(tokens[0])
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+
+profile_store = ProfileStore()
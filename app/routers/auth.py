@@ -1,5 +1,6 @@
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from ..database import get_db
 from ..schemas import UserCreate, UserResponse, Token, LoginRequest, RefreshTokenRequest
@@ -11,12 +12,23 @@ from ..auth import (
     validate_refresh_token,
     revoke_refresh_token
 )
+from ..audit import auth_events
 from ..config import get_settings
+from ..profiling import ProfiledRoute
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], route_class=ProfiledRoute)
 settings = get_settings()
 
 
+def _record_auth_event(request: Request, user_id: int, event_type: str) -> None:
+    auth_events.record(
+        user_id,
+        event_type,
+        ip_address=request.client.host if request.client else None,
+        user_agent=request.headers.get("user-agent")
+    )
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 def register_user(user: UserCreate, db: Session = Depends(get_db)):
     if get_user_by_email(db, email=user.email):
@@ -31,11 +43,18 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
             detail="Username already registered"
         )
     
-    return create_user(db=db, user=user)
+    try:
+        return create_user(db=db, user=user)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username or email already registered"
+        )
 
 
 @router.post("/login", response_model=Token)
-def login(user_credentials: LoginRequest, db: Session = Depends(get_db)):
+def login(user_credentials: LoginRequest, request: Request, db: Session = Depends(get_db)):
     user = get_user_by_credentials(db, username=user_credentials.username)
     
     if not user or not verify_password(user_credentials.password, user.hashed_password):
@@ -52,6 +71,7 @@ def login(user_credentials: LoginRequest, db: Session = Depends(get_db)):
     )
     
     refresh_token = create_refresh_token(db, user.id)
+    _record_auth_event(request, user.id, "login")
     
     return Token(
         access_token=access_token,
@@ -63,6 +83,7 @@ def login(user_credentials: LoginRequest, db: Session = Depends(get_db)):
 @router.post("/refresh", response_model=Token)
 def refresh_access_token(
     token_request: RefreshTokenRequest,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     user = validate_refresh_token(db, token_request.refresh_token)
@@ -82,6 +103,7 @@ def refresh_access_token(
     )
     
     refresh_token = create_refresh_token(db, user.id)
+    _record_auth_event(request, user.id, "refresh")
     
     return Token(
         access_token=access_token,
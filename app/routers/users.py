@@ -1,24 +1,33 @@
-from typing import List
+from typing import List, Literal
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from sqlalchemy.orm import Session
 from ..database import get_db
-from ..schemas import UserResponse, UserUpdate
+from ..schemas import UserResponse, UserUpdate, PasswordChange, UserFilter, SessionResponse, BulkUserAction, BulkUserResponse, BulkUserResult
 from ..models import User
-from ..dependencies import get_current_user, get_admin_user
-from ..crud import get_users, update_user, delete_user
+from ..dependencies import get_current_user, get_current_user_entity, get_admin_user
+from ..principal import Principal
+from ..config import get_settings
+from ..crud import get_user, get_users, search_users, update_user, change_user_password, delete_user, bulk_update_users
+from ..admission import admission_controller
+from ..audit import auth_events
+from ..cache import user_cache
+from ..profiling import ProfiledRoute, create_profile_token, profile_store
+from ..auth import verify_password, get_active_refresh_tokens, revoke_all_refresh_tokens, revoke_refresh_token_by_id
 
-router = APIRouter(prefix="/users", tags=["Users"])
+router = APIRouter(prefix="/users", tags=["Users"], route_class=ProfiledRoute)
+settings = get_settings()
 
 
 @router.get("/me", response_model=UserResponse)
-def read_users_me(current_user: User = Depends(get_current_user)):
+def read_users_me(current_user: User = Depends(get_current_user_entity)):
     return current_user
 
 
 @router.put("/me", response_model=UserResponse)
 def update_users_me(
     user_update: UserUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     updated_user = update_user(db, current_user.id, user_update)
@@ -30,20 +39,156 @@ def update_users_me(
     return updated_user
 
 
+@router.put("/me/password")
+def change_users_me_password(
+    password_change: PasswordChange,
+    current_user: User = Depends(get_current_user_entity),
+    db: Session = Depends(get_db)
+):
+    if not verify_password(password_change.current_password, current_user.hashed_password):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Current password is incorrect"
+        )
+    if password_change.new_password == password_change.current_password:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="New password must be different from the current password"
+        )
+    revoked = change_user_password(db, current_user, password_change.new_password)
+    return {"message": "Password updated", "revoked": revoked}
+
+
+@router.get("/me/sessions", response_model=List[SessionResponse])
+def read_users_me_sessions(
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return get_active_refresh_tokens(db, current_user.id)
+
+
+@router.delete("/me/sessions")
+def revoke_users_me_sessions(
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    revoked = revoke_all_refresh_tokens(db, current_user.id)
+    return {"message": "All sessions revoked", "revoked": revoked}
+
+
+@router.delete("/me/sessions/{session_id}")
+def revoke_users_me_session(
+    session_id: int,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if not revoke_refresh_token_by_id(db, current_user.id, session_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+    return {"message": "Session revoked"}
+
+
 @router.get("/admin/users", response_model=List[UserResponse])
 def read_all_users(
     skip: int = 0,
     limit: int = 100,
-    admin_user: User = Depends(get_admin_user),
+    admin_user: Principal = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
     return get_users(db, skip=skip, limit=limit)
 
 
+@router.get("/admin/users/search", response_model=List[UserResponse])
+def search_all_users(
+    filters: UserFilter = Depends(),
+    skip: int = 0,
+    limit: int = 100,
+    admin_user: Principal = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    return search_users(db, filters, skip=skip, limit=limit)
+
+
+@router.post("/admin/users/bulk", response_model=BulkUserResponse)
+def bulk_update_all_users(
+    bulk_action: BulkUserAction,
+    admin_user: Principal = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    affected = bulk_update_users(
+        db,
+        bulk_action.action,
+        caller_id=admin_user.id,
+        user_ids=bulk_action.user_ids,
+        filters=bulk_action.filter
+    )
+
+    done = "deleted" if bulk_action.action == "delete" else "updated"
+    results = [BulkUserResult(id=user_id, status=done) for user_id in affected]
+    if bulk_action.user_ids is not None:
+        affected_ids = set(affected)
+        for user_id in dict.fromkeys(bulk_action.user_ids):
+            if user_id == admin_user.id:
+                results.append(BulkUserResult(id=user_id, status="skipped_self"))
+            elif user_id not in affected_ids:
+                results.append(BulkUserResult(id=user_id, status="not_found"))
+
+    return BulkUserResponse(action=bulk_action.action, affected=len(affected), results=results)
+
+
+@router.get("/admin/metrics")
+def read_metrics(admin_user: Principal = Depends(get_admin_user)):
+    return {
+        "auth_events": auth_events.metrics(),
+        "user_cache": user_cache.metrics(),
+        "admission": admission_controller.metrics()
+    }
+
+
+@router.post("/admin/profiles/token")
+def create_profiling_token(admin_user: Principal = Depends(get_admin_user)):
+    return {
+        "token": create_profile_token(admin_user.id),
+        "header": "X-Profile-Token",
+        "expires_in": settings.profiling_token_expire_minutes * 60
+    }
+
+
+@router.get("/admin/profiles")
+def read_profiles(admin_user: Principal = Depends(get_admin_user)):
+    return profile_store.all()
+
+
+@router.get("/admin/profiles/{profile_id}")
+def download_profile(
+    profile_id: str,
+    format: Literal["speedscope", "collapsed"] = "speedscope",
+    admin_user: Principal = Depends(get_admin_user)
+):
+    artifact = profile_store.get(profile_id)
+    if not artifact:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+
+    if format == "collapsed":
+        return PlainTextResponse(
+            artifact["collapsed"],
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'}
+        )
+    return JSONResponse(
+        artifact["speedscope"],
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.speedscope.json"'}
+    )
+
+
 @router.delete("/admin/users/{user_id}")
 def delete_user_by_id(
     user_id: int,
-    admin_user: User = Depends(get_admin_user),
+    admin_user: Principal = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
     if user_id == admin_user.id:
@@ -60,3 +205,18 @@ def delete_user_by_id(
     
     return {"message": "User deleted successfully"}
 
+
+@router.delete("/admin/users/{user_id}/sessions")
+def revoke_user_sessions(
+    user_id: int,
+    admin_user: Principal = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    if not get_user(db, user_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
+    revoked = revoke_all_refresh_tokens(db, user_id)
+    return {"message": "All sessions revoked", "revoked": revoked}
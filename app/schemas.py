@@ -1,7 +1,8 @@
 from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel, EmailStr, field_validator
+from typing import List, Literal, Optional
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
 import re
+from .breach import is_breached_password
 
 
 class UserBase(BaseModel):
@@ -17,21 +18,27 @@ class UserBase(BaseModel):
         return v
 
 
+def check_password_strength(v: str) -> str:
+    if len(v) < 8:
+        raise ValueError('Password must be at least 8 characters')
+    if not re.search(r'[A-Z]', v):
+        raise ValueError('Password must contain at least one uppercase letter')
+    if not re.search(r'[a-z]', v):
+        raise ValueError('Password must contain at least one lowercase letter')
+    if not re.search(r'\d', v):
+        raise ValueError('Password must contain at least one digit')
+    if is_breached_password(v):
+        raise ValueError('Password has appeared in a data breach, please choose a different one')
+    return v
+
+
 class UserCreate(UserBase):
     password: str
 
     @field_validator('password')
     @classmethod
     def validate_password(cls, v):
-        if len(v) < 8:
-            raise ValueError('Password must be at least 8 characters')
-        if not re.search(r'[A-Z]', v):
-            raise ValueError('Password must contain at least one uppercase letter')
-        if not re.search(r'[a-z]', v):
-            raise ValueError('Password must contain at least one lowercase letter')
-        if not re.search(r'\d', v):
-            raise ValueError('Password must contain at least one digit')
-        return v
+        return check_password_strength(v)
 
 
 class UserUpdate(BaseModel):
@@ -39,12 +46,63 @@ class UserUpdate(BaseModel):
     full_name: Optional[str] = None
 
 
+class PasswordChange(BaseModel):
+    current_password: str
+    new_password: str
+
+    @field_validator('new_password')
+    @classmethod
+    def validate_new_password(cls, v):
+        return check_password_strength(v)
+
+
+class UserFilter(BaseModel):
+    q: Optional[str] = None
+    match: Literal["prefix", "contains"] = "prefix"
+    is_active: Optional[bool] = None
+    is_admin: Optional[bool] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+    def has_criteria(self) -> bool:
+        return bool(self.q) or any(
+            value is not None
+            for value in (self.is_active, self.is_admin, self.created_from, self.created_to)
+        )
+
+
+class BulkUserAction(BaseModel):
+    action: Literal["activate", "deactivate", "delete", "set_admin", "unset_admin"]
+    user_ids: Optional[List[int]] = Field(default=None, min_length=1, max_length=10000)
+    filter: Optional[UserFilter] = None
+
+    @model_validator(mode='after')
+    def validate_target(self):
+        if (self.user_ids is None) == (self.filter is None):
+            raise ValueError('Exactly one of user_ids or filter must be provided')
+        if self.filter is not None and not self.filter.has_criteria():
+            raise ValueError('filter must set at least one of q, is_active, is_admin, created_from or created_to')
+        return self
+
+
+class BulkUserResult(BaseModel):
+    id: int
+    status: Literal["updated", "deleted", "not_found", "skipped_self"]
+
+
+class BulkUserResponse(BaseModel):
+    action: str
+    affected: int
+    results: List[BulkUserResult]
+
+
 class UserInDB(UserBase):
     id: int
     is_active: bool
     is_admin: bool
     created_at: datetime
     updated_at: Optional[datetime]
+    last_login_at: Optional[datetime] = None
 
     model_config = dict(from_attributes=True)
 
@@ -65,6 +123,14 @@ class TokenData(BaseModel):
     username: Optional[str] = None
 
 
+class SessionResponse(BaseModel):
+    id: int
+    created_at: datetime
+    expires_at: datetime
+
+    model_config = dict(from_attributes=True)
+
+
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
@@ -0,0 +1,98 @@
+import os
+from typing import Any, Dict, Tuple
+
+from gunicorn.app.base import BaseApplication
+
+from .config import Settings, available_cpus, get_settings
+
+
+def worker_count(settings: Settings) -> int:
+    if settings.web_concurrency:
+        return settings.web_concurrency
+    workers = available_cpus()
+    if settings.db_connection_budget is not None:
+        workers = min(workers, settings.db_connection_budget // (background_connections(settings) + 1))
+    return max(workers, 1)
+
+
+def background_connections(settings: Settings) -> int:
+    reserved = 1
+    if settings.user_cache_ttl_seconds > 0:
+        reserved += 1
+    return reserved
+
+
+def pool_limits(settings: Settings, workers: int) -> Tuple[int, int]:
+    if settings.db_connection_budget is None:
+        return settings.db_pool_size, settings.db_max_overflow
+    per_worker = settings.db_connection_budget // workers
+    reserved = background_connections(settings)
+    if per_worker - reserved < 1:
+        raise ValueError(
+            f"DB_CONNECTION_BUDGET={settings.db_connection_budget} leaves no connections for requests "
+            f"across {workers} workers after reserving {reserved} per worker for background work"
+        )
+    pool_size = min(settings.db_pool_size + reserved, per_worker)
+    return pool_size, per_worker - pool_size
+
+
+def worker_environment(settings: Settings, workers: int) -> Dict[str, str]:
+    pool_size, max_overflow = pool_limits(settings, workers)
+    environment = {"DB_POOL_SIZE": str(pool_size), "DB_MAX_OVERFLOW": str(max_overflow)}
+    if "admission_max_concurrency" not in settings.model_fields_set:
+        environment["ADMISSION_MAX_CONCURRENCY"] = str(max(available_cpus() // workers, 1))
+    return environment
+
+
+def post_fork(server, worker) -> None:
+    from .database import engine, shard_engines
+    for bound in (engine, *shard_engines.values()):
+        bound.dispose(close=False)
+
+
+def server_options(settings: Settings, workers: int) -> Dict[str, Any]:
+    return {
+        "bind": f"{settings.server_host}:{settings.server_port}",
+        "workers": workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "backlog": settings.server_backlog,
+        "keepalive": settings.server_keepalive_seconds,
+        "timeout": settings.server_timeout_seconds,
+        "graceful_timeout": settings.server_graceful_timeout_seconds,
+        "max_requests": settings.server_max_requests,
+        "max_requests_jitter": settings.server_max_requests_jitter,
+        "post_fork": post_fork,
+    }
+
+
+class Server(BaseApplication):
+    def __init__(self, options: Dict[str, Any]):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from .breach import get_breached_passwords
+        from .database import create_tables, engine, shard_engines
+        from .main import app
+        get_breached_passwords()
+        create_tables()
+        for bound in (engine, *shard_engines.values()):
+            bound.dispose()
+        return app
+
+
+def main() -> None:
+    settings = get_settings()
+    workers = worker_count(settings)
+    os.environ.update(worker_environment(settings, workers))
+    get_settings.cache_clear()
+    Server(server_options(get_settings(), workers)).run()
+
+
+if __name__ == "__main__":
+    main()
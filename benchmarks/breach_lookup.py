@@ -0,0 +1,80 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from array import array
+
+from app.breach import DEFAULT_PREFIX_BYTES, HEADER, MAGIC, VERSION, BreachedPasswords
+
+
+def generate(path: str, entries: int, chunk_size: int = 1_000_000) -> None:
+    step = 2 ** 64 // entries
+    started = time.perf_counter()
+    with open(path + ".tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, DEFAULT_PREFIX_BYTES, 0, entries))
+        for first in range(0, entries, chunk_size):
+            chunk = array("Q", (
+                index * step + random.randrange(step)
+                for index in range(first, min(first + chunk_size, entries))
+            ))
+            if sys.byteorder == "little":
+                chunk.byteswap()
+            chunk.tofile(f)
+            done = min(first + chunk_size, entries)
+            print(f"\rgenerated {done:,}/{entries:,} entries ({done / (time.perf_counter() - started):,.0f}/s)", end="")
+    os.replace(path + ".tmp", path)
+    print()
+
+
+def anonymous_memory_kib() -> int:
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            return sum(int(line.split()[1]) for line in f if line.startswith("Anonymous:"))
+    except OSError:
+        return -1
+
+
+def measure(label: str, lookup, keys) -> None:
+    started = time.perf_counter()
+    hits = sum(1 for key in keys if lookup(key))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<16} {elapsed / len(keys) * 1e6:>10.2f} us/lookup  {hits:>8} hits")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure breached password lookups against a large synthetic file")
+    parser.add_argument("--entries", type=int, default=200_000_000)
+    parser.add_argument("--path", default=os.path.join(tempfile.gettempdir(), "breached-benchmark.bin"))
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+
+    expected_size = HEADER.size + args.entries * DEFAULT_PREFIX_BYTES
+    if args.rebuild or not os.path.exists(args.path) or os.path.getsize(args.path) != expected_size:
+        generate(args.path, args.entries)
+
+    breached = BreachedPasswords(args.path)
+    width = breached.prefix_bytes
+    with open(args.path, "rb") as f:
+        present = []
+        for index in random.sample(range(len(breached)), min(args.lookups, len(breached))):
+            f.seek(HEADER.size + index * width)
+            present.append(f.read(width) + os.urandom(20 - width))
+    absent = [os.urandom(20) for _ in range(args.lookups)]
+    passwords = [f"Benchmark{random.getrandbits(64):x}" for _ in range(args.lookups)]
+
+    anonymous_before = anonymous_memory_kib()
+    print(f"{len(breached):,} entries, {os.path.getsize(args.path) / 2 ** 20:,.0f} MiB")
+    measure("digest hit", breached.contains_digest, present)
+    measure("digest miss", breached.contains_digest, absent)
+    measure("password", breached.__contains__, passwords)
+    if anonymous_before >= 0:
+        grown = (anonymous_memory_kib() - anonymous_before) / 1024
+        print(f"anonymous memory grew by {grown:,.1f} MiB during lookups; file pages stay in the shared page cache")
+    breached.close()
+
+
+if __name__ == "__main__":
+    main()
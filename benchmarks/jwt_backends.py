@@ -0,0 +1,41 @@
+import argparse
+import timeit
+from datetime import datetime, timedelta, timezone
+
+from app.jwt_backends import JWT_BACKENDS, create_jwt_backend
+
+
+def run(backend_name: str, secret_key: str, algorithm: str, number: int, repeat: int) -> dict:
+    backend = create_jwt_backend(backend_name, secret_key, algorithm)
+    claims = {
+        "sub": "12345",
+        "username": "benchmark_user",
+        "exp": datetime.now(timezone.utc) + timedelta(hours=1),
+    }
+    token = backend.encode(claims)
+    encode = min(timeit.repeat(lambda: backend.encode(claims), number=number, repeat=repeat))
+    decode = min(timeit.repeat(lambda: backend.decode(token), number=number, repeat=repeat))
+    return {"backend": backend_name, "encode_ops": number / encode, "decode_ops": number / decode}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure JWT encode/decode throughput per backend")
+    parser.add_argument("--backends", nargs="+", default=list(JWT_BACKENDS))
+    parser.add_argument("--algorithm", default="HS256")
+    parser.add_argument("--secret-key", default="benchmark-secret-key")
+    parser.add_argument("--number", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'backend':<10} {'encode ops/s':>14} {'decode ops/s':>14}")
+    for name in args.backends:
+        try:
+            result = run(name, args.secret_key, args.algorithm, args.number, args.repeat)
+        except RuntimeError as e:
+            print(f"{name:<10} skipped: {e}")
+            continue
+        print(f"{result['backend']:<10} {result['encode_ops']:>14,.0f} {result['decode_ops']:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import json
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+from app import auth, crud
+from app.config import get_settings
+from app.schemas import UserFilter
+
+WATCHED_TABLES = {"users", "refresh_tokens"}
+
+
+def _sample(connection) -> Dict:
+    user = connection.execute(text(
+        "SELECT id, username, email FROM users WHERE is_active ORDER BY id DESC LIMIT 1"
+    )).one()
+    token = connection.execute(text(
+        "SELECT token, user_id FROM refresh_tokens WHERE NOT is_revoked AND expires_at > now() "
+        "ORDER BY id DESC LIMIT 1"
+    )).one()
+    total = connection.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'users'")).scalar()
+    return {
+        "user_id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "token": token.token,
+        "token_user_id": token.user_id,
+        "deep_offset": max(int(total or 0) // 2, 0),
+    }
+
+
+def cases(sample: Dict) -> List[Tuple[str, Callable[[Session], object]]]:
+    return [
+        ("crud.get_user", lambda db: crud.get_user(db, sample["user_id"])),
+        ("crud.get_principal", lambda db: crud.get_principal(db, sample["user_id"])),
+        ("crud.get_user_by_email", lambda db: crud.get_user_by_email(db, sample["email"])),
+        ("crud.get_user_by_username", lambda db: crud.get_user_by_username(db, sample["username"])),
+        ("crud.get_user_by_credentials[username]", lambda db: crud.get_user_by_credentials(db, sample["username"])),
+        ("crud.get_user_by_credentials[email]", lambda db: crud.get_user_by_credentials(db, sample["email"])),
+        ("crud.get_users[first page]", lambda db: crud.get_users(db, skip=0, limit=100)),
+        ("crud.get_users[deep page]", lambda db: crud.get_users(db, skip=sample["deep_offset"], limit=100)),
+        ("crud.search_users[prefix]", lambda db: crud.search_users(db, UserFilter(q=sample["username"][:6]))),
+        ("auth.validate_refresh_token", lambda db: auth.validate_refresh_token(db, sample["token"])),
+        ("auth.get_active_refresh_tokens", lambda db: auth.get_active_refresh_tokens(db, sample["token_user_id"])),
+        ("auth.revoke_refresh_token", lambda db: auth.revoke_refresh_token(db, sample["token"])),
+        ("auth.revoke_all_refresh_tokens", lambda db: auth.revoke_all_refresh_tokens(db, sample["token_user_id"])),
+    ]
+
+
+def capture_statements(connection, func: Callable[[Session], object]) -> Tuple[List[Tuple], float]:
+    statements: List[Tuple] = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            statements.append((statement, parameters))
+
+    db = Session(bind=connection, join_transaction_mode="create_savepoint")
+    event.listen(connection, "before_cursor_execute", _capture)
+    started = time.perf_counter()
+    try:
+        func(db)
+    finally:
+        elapsed = time.perf_counter() - started
+        event.remove(connection, "before_cursor_execute", _capture)
+        db.close()
+    return statements, elapsed
+
+
+def seq_scans(plan: Dict) -> List[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in WATCHED_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def explain(connection, statement: str, parameters) -> Dict:
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters)
+        result = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    return (json.loads(result) if isinstance(result, str) else result)[0]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check query plans of auth and user queries at scale")
+    parser.add_argument("--database-url", default=get_settings().database_url)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail when a query executes slower than this")
+    parser.add_argument("--verbose", action="store_true", help="print every captured plan")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    failures = 0
+    with engine.connect() as connection:
+        sample = _sample(connection)
+        connection.rollback()
+        print(f"{'query':<42} {'call ms':>9} {'exec ms':>9} {'buffers':>9}  plan")
+        for name, func in cases(sample):
+            transaction = connection.begin()
+            try:
+                statements, elapsed = capture_statements(connection, func)
+                for index, (statement, parameters) in enumerate(statements):
+                    result = explain(connection, statement, parameters)
+                    plan = result["Plan"]
+                    buffers = plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0)
+                    scans = seq_scans(plan)
+                    problems = [f"Seq Scan on {table}" for table in scans]
+                    if args.max_ms is not None and result["Execution Time"] > args.max_ms:
+                        problems.append(f"slower than {args.max_ms}ms")
+                    failures += bool(problems)
+                    label = name if index == 0 else f"  +{index}"
+                    status = "FAIL: " + ", ".join(problems) if problems else plan["Node Type"]
+                    call_ms = f"{elapsed * 1000:.2f}" if index == 0 else ""
+                    print(f"{label:<42} {call_ms:>9} {result['Execution Time']:>9.2f} {buffers:>9}  {status}")
+                    if args.verbose:
+                        print(json.dumps(plan, indent=2))
+            finally:
+                transaction.rollback()
+
+    print(f"{failures} plan regression(s)" if failures else "All plans use indexes")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
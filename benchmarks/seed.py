@@ -0,0 +1,163 @@
+import argparse
+import multiprocessing
+import random
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Tuple
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from app.auth import get_password_hash
+from app.config import get_settings
+from app.database import Base
+from app.models import RefreshToken, User
+
+SEED_PASSWORD = "SeedPassword123"
+TIMESTAMP_POOL_SIZE = 4096
+USER_COLUMNS = "id, email, username, hashed_password, full_name, is_active, is_admin, created_at"
+TOKEN_COLUMNS = "user_id, token, expires_at, is_revoked, created_at"
+SEEDED_TABLES = (User.__table__, RefreshToken.__table__)
+
+
+class CopyStream:
+    def __init__(self, rows: Iterator[str], rows_per_chunk: int = 10000):
+        self._rows = rows
+        self._rows_per_chunk = rows_per_chunk
+        self._buffer = ""
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            chunk = "".join(row for _, row in zip(range(self._rows_per_chunk), self._rows))
+            if not chunk:
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, ""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size: int = -1) -> str:
+        return self.read(size)
+
+
+def _timestamps(span: timedelta) -> List[datetime]:
+    now = datetime.now(timezone.utc)
+    seconds = int(span.total_seconds())
+    return [now - timedelta(seconds=random.randrange(seconds)) for _ in range(TIMESTAMP_POOL_SIZE)]
+
+
+def user_rows(first_id: int, count: int, hashed_password: str) -> Iterator[str]:
+    created = [ts.isoformat() for ts in _timestamps(timedelta(days=3 * 365))]
+    for user_id in range(first_id, first_id + count):
+        is_active = "f" if random.random() < 0.05 else "t"
+        is_admin = "t" if random.random() < 0.001 else "f"
+        yield (
+            f"{user_id},seed{user_id}@example.com,seed_{user_id},{hashed_password},"
+            f"Seed User {user_id},{is_active},{is_admin},{random.choice(created)}\n"
+        )
+
+
+def token_rows(first_user_id: int, user_count: int, count: int) -> Iterator[str]:
+    lifetimes = [
+        f"{(ts + timedelta(days=14)).isoformat()},{{}},{ts.isoformat()}"
+        for ts in _timestamps(timedelta(days=30))
+    ]
+    for _ in range(count):
+        user_id = first_user_id + random.randrange(user_count)
+        is_revoked = "t" if random.random() < 0.5 else "f"
+        yield f"{user_id},{secrets.token_urlsafe(32)},{random.choice(lifetimes).format(is_revoked)}\n"
+
+
+def copy_batch(task: Tuple[str, str, str, int, int, int]) -> Tuple[str, int, float]:
+    database_url, table, hashed_password, first_id, count, user_count = task
+    started = time.perf_counter()
+    engine = create_engine(database_url, poolclass=NullPool)
+    raw_connection = engine.raw_connection()
+    try:
+        with raw_connection.cursor() as cursor:
+            cursor.execute("SET synchronous_commit = off")
+            if table == "users":
+                rows, columns = user_rows(first_id, count, hashed_password), USER_COLUMNS
+            else:
+                rows, columns = token_rows(first_id, user_count, count), TOKEN_COLUMNS
+            cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", CopyStream(rows))
+        raw_connection.commit()
+    finally:
+        raw_connection.close()
+    return table, count, time.perf_counter() - started
+
+
+def run_batches(tasks: List[Tuple], jobs: int) -> None:
+    total = sum(task[4] for task in tasks)
+    done = 0
+    started = time.perf_counter()
+    with multiprocessing.Pool(jobs) as pool:
+        for table, count, _ in pool.imap_unordered(copy_batch, tasks):
+            done += count
+            elapsed = time.perf_counter() - started
+            print(f"{table}: {done}/{total} rows ({done / elapsed:,.0f} rows/s)")
+
+
+def drop_secondary_indexes(engine) -> None:
+    with engine.begin() as connection:
+        for table in SEEDED_TABLES:
+            for index in table.indexes:
+                index.drop(connection, checkfirst=True)
+
+
+def create_secondary_indexes(engine, maintenance_work_mem: str) -> None:
+    with engine.begin() as connection:
+        connection.execute(text("SELECT set_config('maintenance_work_mem', :value, true)"), {"value": maintenance_work_mem})
+        for table in SEEDED_TABLES:
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                started = time.perf_counter()
+                index.create(connection, checkfirst=True)
+                print(f"created {index.name} in {time.perf_counter() - started:.1f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk-load synthetic users and refresh tokens with COPY")
+    parser.add_argument("--database-url", default=get_settings().database_url)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--tokens", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=500000)
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--maintenance-work-mem", default="1GB", help="memory for each index build")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url, poolclass=NullPool)
+    Base.metadata.create_all(bind=engine)
+    drop_secondary_indexes(engine)
+    hashed_password = get_password_hash(SEED_PASSWORD)
+
+    with engine.begin() as connection:
+        first_id = connection.execute(text("SELECT COALESCE(MAX(id), 0) + 1 FROM users")).scalar()
+
+    try:
+        run_batches([
+            (args.database_url, "users", hashed_password, first_id + offset,
+             min(args.batch_size, args.users - offset), args.users)
+            for offset in range(0, args.users, args.batch_size)
+        ], args.jobs)
+
+        with engine.begin() as connection:
+            connection.execute(text("SELECT setval(pg_get_serial_sequence('users', 'id'), (SELECT MAX(id) FROM users))"))
+
+        if args.users:
+            run_batches([
+                (args.database_url, "refresh_tokens", hashed_password, first_id,
+                 min(args.batch_size, args.tokens - offset), args.users)
+                for offset in range(0, args.tokens, args.batch_size)
+            ], args.jobs)
+    finally:
+        create_secondary_indexes(engine, args.maintenance_work_mem)
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE users, refresh_tokens"))
+    print(f"Seeded users can log in with password {SEED_PASSWORD!r}")
+
+
+if __name__ == "__main__":
+    main()
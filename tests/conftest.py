@@ -3,6 +3,8 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from app.audit import auth_events
+from app.breach import BreachedPasswords, compile_corpus, parse_corpus
 from app.database import Base, get_db
 from app.main import app
 from app.models import User
@@ -25,6 +27,10 @@ def setup_database():
     yield
     Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture(scope="session")
+def db_engine():
+    return engine
+
 @pytest.fixture(scope="function")
 def db_session():
     connection = engine.connect()
@@ -36,13 +42,15 @@ def db_session():
     connection.close()
 
 @pytest.fixture(scope="function")
-def client(db_session):
+def client(db_session, monkeypatch):
     def _override_get_db():
         try:
             yield db_session
         finally:
             pass
 
+    monkeypatch.setattr(auth_events, "session_factory", lambda: db_session)
+    monkeypatch.setattr(auth_events, "start", lambda: None)
     app.dependency_overrides[get_db] = _override_get_db
     with TestClient(app) as c:
         yield c
@@ -85,6 +93,17 @@ def auth_token(client, test_user):
     assert response.status_code == 200
     return response.json()["access_token"]
 
+@pytest.fixture(scope="function")
+def login(client, test_user):
+    def _login(username="testuser", password="TestPassword123"):
+        response = client.post("/auth/login", json={
+            "username": username,
+            "password": password
+        })
+        assert response.status_code == 200
+        return response.json()
+    return _login
+
 @pytest.fixture(scope="function")
 def admin_token(client, admin_user):
     response = client.post("/auth/login", json={
@@ -93,3 +112,19 @@ def admin_token(client, admin_user):
     })
     assert response.status_code == 200
     return response.json()["access_token"]
+
+
+@pytest.fixture(scope="function")
+def breach_file(tmp_path):
+    corpus = ["Breached123", "Password1", "Summer2024", "Password1"]
+    path = str(tmp_path / "breached.bin")
+    assert compile_corpus(parse_corpus(corpus, plaintext=True), path, run_size=2) == 3
+    return path
+
+
+@pytest.fixture(scope="function")
+def breached(breach_file, monkeypatch):
+    passwords = BreachedPasswords(breach_file)
+    monkeypatch.setattr("app.breach.get_breached_passwords", lambda: passwords)
+    yield passwords
+    passwords.close()
@@ -1,5 +1,15 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+
 import pytest
 from fastapi import status
+from app.admission import AdmissionController, admission_controller
+from app.audit import AuthEventQueue, auth_events
+from app.breach import BreachedPasswords, compile_corpus, parse_corpus
+from app.config import AdmissionRoute
+from app.jwt_backends import JWTBackend, TokenError, create_jwt_backend
+from app.models import AuthEvent, User
 
 class TestUserRegistration:
     
@@ -172,3 +182,228 @@ class TestTokenRefresh:
             "refresh_token": refresh_token
         })
         assert second_refresh.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestAuthEventQueue:
+
+    @pytest.fixture
+    def make_auth_event_queue(self, db_session):
+        def _make(**kwargs):
+            options = dict(max_size=10, batch_size=5, flush_interval=60, full_policy="drop_newest")
+            options.update(kwargs)
+            return AuthEventQueue(session_factory=lambda: db_session, **options)
+        return _make
+
+    def test_flush_writes_events_and_last_login(self, db_session, test_user, make_auth_event_queue):
+        user_id = test_user.id
+        queue = make_auth_event_queue()
+        queue.record(user_id, "login", ip_address="127.0.0.1")
+        queue.record(user_id, "refresh")
+        queue.record(user_id, "login")
+        assert queue.metrics()["depth"] == 3
+        assert queue.flush() == 3
+        events = db_session.query(AuthEvent).filter(AuthEvent.user_id == user_id).all()
+        assert sorted(e.event_type for e in events) == ["login", "login", "refresh"]
+        user = db_session.get(User, user_id)
+        assert user.last_login_at == max(e.created_at for e in events if e.event_type == "login")
+        metrics = queue.metrics()
+        assert metrics["depth"] == 0
+        assert metrics["flushed"] == 3
+
+    def test_drop_newest_when_full(self, make_auth_event_queue):
+        queue = make_auth_event_queue(max_size=2)
+        assert queue.record(1, "login")
+        assert queue.record(2, "login")
+        assert not queue.record(3, "login")
+        metrics = queue.metrics()
+        assert metrics["depth"] == 2
+        assert metrics["dropped"] == 1
+
+    def test_drop_oldest_when_full(self, make_auth_event_queue):
+        queue = make_auth_event_queue(max_size=2, full_policy="drop_oldest")
+        for user_id in (1, 2, 3):
+            assert queue.record(user_id, "login")
+        assert [e["user_id"] for e in queue._events] == [2, 3]
+        assert queue.metrics()["dropped"] == 1
+
+    def test_block_times_out_and_drops(self, make_auth_event_queue):
+        queue = make_auth_event_queue(max_size=1, full_policy="block", block_timeout=0.01)
+        assert queue.record(1, "login")
+        assert not queue.record(2, "login")
+        assert queue.metrics()["dropped"] == 1
+
+    def test_client_events_stay_in_test_session(self, client, login, db_session, test_user):
+        user_id = test_user.id
+        login()
+        auth_events.flush()
+        events = db_session.query(AuthEvent).filter(AuthEvent.user_id == user_id).all()
+        assert [e.event_type for e in events] == ["login"]
+
+    def test_metrics_endpoint_admin_only(self, client, admin_token, auth_token):
+        response = client.get("/users/admin/metrics", headers={"Authorization": f"Bearer {admin_token}"})
+        assert response.status_code == status.HTTP_200_OK
+        assert "depth" in response.json()["auth_events"]
+        response = client.get("/users/admin/metrics", headers={"Authorization": f"Bearer {auth_token}"})
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestJWTBackends:
+
+    @pytest.mark.parametrize("name", ["jose", "pyjwt"])
+    def test_round_trip(self, name):
+        backend = create_jwt_backend(name, "secret", "HS256")
+        token = backend.encode({"sub": "1", "exp": datetime.now(timezone.utc) + timedelta(minutes=5)})
+        assert backend.decode(token)["sub"] == "1"
+
+    def test_backends_are_interchangeable(self):
+        jose_backend = create_jwt_backend("jose", "secret", "HS256")
+        pyjwt_backend = create_jwt_backend("pyjwt", "secret", "HS256")
+        assert pyjwt_backend.decode(jose_backend.encode({"sub": "1"}))["sub"] == "1"
+        assert jose_backend.decode(pyjwt_backend.encode({"sub": "2"}))["sub"] == "2"
+
+    @pytest.mark.parametrize("name", ["jose", "pyjwt"])
+    def test_invalid_tokens_raise_token_error(self, name):
+        backend = create_jwt_backend(name, "secret", "HS256")
+        other = create_jwt_backend(name, "other-secret", "HS256")
+        expired = backend.encode({"sub": "1", "exp": datetime.now(timezone.utc) - timedelta(minutes=5)})
+        for token in ("not-a-token", other.encode({"sub": "1"}), expired):
+            with pytest.raises(TokenError):
+                backend.decode(token)
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            create_jwt_backend("unknown", "secret", "HS256")
+
+    def test_backend_must_implement_encode_and_decode(self):
+        class Incomplete(JWTBackend):
+            name = "incomplete"
+
+        with pytest.raises(TypeError):
+            Incomplete("secret", "HS256")
+
+
+class TestAdmissionControl:
+
+    @pytest.fixture
+    def make_admission_controller(self):
+        def _make(**kwargs):
+            options = dict(
+                routes={"/high": AdmissionRoute(priority=10), "/low": AdmissionRoute(priority=0),
+                        "/capped": AdmissionRoute(max_concurrency=1)},
+                max_concurrency=1,
+                max_queue=2,
+                queue_timeout=1.0
+            )
+            options.update(kwargs)
+            return AdmissionController(**options)
+        return _make
+
+    def test_sheds_when_queue_full(self, make_admission_controller):
+        controller = make_admission_controller(max_queue=1)
+
+        async def scenario():
+            assert await controller.acquire("/low")
+            queued = asyncio.ensure_future(controller.acquire("/low"))
+            await asyncio.sleep(0)
+            assert not await controller.acquire("/low")
+            controller.release("/low")
+            assert await queued
+            controller.release("/low")
+
+        asyncio.run(scenario())
+        stats = controller.metrics()["routes"]["/low"]
+        assert stats["shed_queue_full"] == 1
+        assert stats["admitted"] == 2
+        assert controller.metrics()["in_flight"] == 0
+
+    def test_sheds_after_queue_timeout(self, make_admission_controller):
+        controller = make_admission_controller(queue_timeout=0.01)
+
+        async def scenario():
+            assert await controller.acquire("/low")
+            assert not await controller.acquire("/low")
+            controller.release("/low")
+
+        asyncio.run(scenario())
+        assert controller.metrics()["routes"]["/low"]["shed_timeout"] == 1
+        assert controller.metrics()["queued"] == 0
+
+    def test_higher_priority_admitted_first(self, make_admission_controller):
+        controller = make_admission_controller()
+        order = []
+
+        async def request(route):
+            assert await controller.acquire(route)
+            order.append(route)
+            controller.release(route)
+
+        async def scenario():
+            assert await controller.acquire("/low")
+            waiters = [asyncio.ensure_future(request("/low")), asyncio.ensure_future(request("/high"))]
+            await asyncio.sleep(0)
+            controller.release("/low")
+            await asyncio.gather(*waiters)
+
+        asyncio.run(scenario())
+        assert order == ["/high", "/low"]
+
+    def test_per_route_limit(self, make_admission_controller):
+        controller = make_admission_controller(max_concurrency=2, queue_timeout=0.01)
+
+        async def scenario():
+            assert await controller.acquire("/capped")
+            assert not await controller.acquire("/capped")
+            assert await controller.acquire("/low")
+
+        asyncio.run(scenario())
+
+    def test_middleware_returns_503_with_retry_after(self, client, monkeypatch):
+        monkeypatch.setattr(admission_controller, "max_concurrency", 0)
+        monkeypatch.setattr(admission_controller, "max_queue", 0)
+        response = client.post("/auth/login", json={"username": "testuser", "password": "TestPassword123"})
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["retry-after"] == "1"
+        assert client.get("/health").status_code == status.HTTP_200_OK
+
+    def test_middleware_only_gates_configured_methods(self, client, monkeypatch):
+        monkeypatch.setattr(admission_controller, "max_concurrency", 0)
+        monkeypatch.setattr(admission_controller, "max_queue", 0)
+        preflight = client.options("/auth/login", headers={
+            "Origin": "http://localhost:3000",
+            "Access-Control-Request-Method": "POST"
+        })
+        assert preflight.status_code != status.HTTP_503_SERVICE_UNAVAILABLE
+        assert client.get("/auth/login").status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+        assert admission_controller.metrics()["in_flight"] == 0
+
+
+class TestBreachedPasswords:
+
+    def test_lookup(self, breached):
+        assert len(breached) == 3
+        assert "Breached123" in breached
+        assert "Summer2024" in breached
+        assert "NotBreached123" not in breached
+
+    def test_compile_sha1_corpus(self, tmp_path):
+        lines = [hashlib.sha1(b"Breached123").hexdigest().upper() + ":42\n", "not-a-hash\n"]
+        path = str(tmp_path / "hashes.bin")
+        assert compile_corpus(parse_corpus(lines, plaintext=False), path) == 1
+        passwords = BreachedPasswords(path)
+        assert "Breached123" in passwords
+        passwords.close()
+
+    def test_rejects_invalid_file(self, tmp_path):
+        path = tmp_path / "invalid.bin"
+        path.write_bytes(b"not a breach file")
+        with pytest.raises(ValueError):
+            BreachedPasswords(str(path))
+
+    def test_register_breached_password(self, client, breached):
+        response = client.post("/auth/register", json={
+            "email": "breached@example.com",
+            "username": "breacheduser",
+            "password": "Breached123"
+        })
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert "data breach" in response.text
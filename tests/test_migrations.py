@@ -0,0 +1,45 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app.database import Base, add_missing_columns
+from app.migrations import build_missing_indexes
+
+
+class TestSchemaUpgrade:
+
+    def test_adds_last_login_column_to_existing_users_table(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path}/old.db")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE users DROP COLUMN last_login_at"))
+            connection.execute(text(
+                "INSERT INTO users (email, username, hashed_password) VALUES ('old@example.com', 'old', 'x')"
+            ))
+
+        statements = add_missing_columns(engine, Base.metadata)
+        assert statements == ['ALTER TABLE users ADD COLUMN last_login_at DATETIME']
+        columns = {column["name"] for column in inspect(engine).get_columns("users")}
+        assert "last_login_at" in columns
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT last_login_at FROM users")).scalar() is None
+        assert add_missing_columns(engine, Base.metadata) == []
+        engine.dispose()
+
+    def test_missing_table_is_left_to_create_all(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path}/empty.db")
+        assert add_missing_columns(engine, Base.metadata) == []
+        engine.dispose()
+
+    def test_builds_missing_indexes_concurrently(self, db_engine):
+        with db_engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_users_email_lower"))
+            connection.execute(text("DROP INDEX ix_users_created_at"))
+
+        statements = build_missing_indexes(db_engine, Base.metadata)
+        assert statements == [
+            "CREATE INDEX CONCURRENTLY ix_users_created_at ON users (created_at)",
+            "CREATE INDEX CONCURRENTLY ix_users_email_lower ON users (lower(email) text_pattern_ops)",
+        ]
+        indexes = {index["name"] for index in inspect(db_engine).get_indexes("users")}
+        assert {"ix_users_created_at", "ix_users_email_lower"} <= indexes
+        assert build_missing_indexes(db_engine, Base.metadata) == []
+
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+from app.profiling import ProfiledRoute, ProfileStore, ProfilingMiddleware, RequestProfile, profile_store
+
+
+class TestProfiling:
+
+    @pytest.fixture
+    def profile_token(self, client, admin_token):
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = client.post("/users/admin/profiles/token", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()["token"]
+
+    @pytest.fixture(autouse=True)
+    def profile_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(profile_store, "directory", str(tmp_path / "profiles"))
+        return tmp_path / "profiles"
+
+    def test_profiled_request_produces_artifact(self, client, admin_token, profile_token, test_user):
+        response = client.post("/auth/login", json={
+            "username": "testuser",
+            "password": "TestPassword123"
+        }, headers={"X-Profile-Token": profile_token})
+        assert response.status_code == status.HTTP_200_OK
+        profile_id = response.headers["x-profile-id"]
+
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        summaries = client.get("/users/admin/profiles", headers=headers).json()
+        summary = next(p for p in summaries if p["id"] == profile_id)
+        assert summary["path"] == "/auth/login"
+        assert summary["db_queries"] > 0
+        assert summary["hashing_calls"] == 1
+
+        artifact = client.get(f"/users/admin/profiles/{profile_id}", headers=headers)
+        assert artifact.status_code == status.HTTP_200_OK
+        assert artifact.json()["profiles"][0]["type"] == "sampled"
+        collapsed = client.get(f"/users/admin/profiles/{profile_id}?format=collapsed", headers=headers)
+        assert collapsed.status_code == status.HTTP_200_OK
+
+    def test_samples_only_the_request_thread(self, client, profile_token, test_user):
+        stop = threading.Event()
+
+        def spin():
+            while not stop.is_set():
+                sum(range(1000))
+
+        busy = threading.Thread(target=spin, name="unrelated-busy", daemon=True)
+        busy.start()
+        try:
+            response = client.post("/auth/login", json={
+                "username": "testuser",
+                "password": "TestPassword123"
+            }, headers={"X-Profile-Token": profile_token})
+        finally:
+            stop.set()
+            busy.join()
+        collapsed = profile_store.get(response.headers["x-profile-id"])["collapsed"]
+        threads = {line.split(";")[0].rsplit(" (", 1)[0] for line in collapsed.splitlines()}
+        assert threads
+        assert "unrelated-busy" not in threads
+        assert threading.main_thread().name not in threads
+
+    def test_profiles_share_one_sampler_thread(self):
+        profiles = [RequestProfile("GET", "/", interval=0.001) for _ in range(3)]
+        for profile in profiles:
+            profile.start()
+        try:
+            samplers = [thread for thread in threading.enumerate() if thread.name == "request-profiler"]
+            assert len(samplers) == 1
+        finally:
+            for profile in profiles:
+                profile.stop()
+
+    def test_handler_threads_sampled_without_db_or_hashing(self, profile_dir):
+        probe = FastAPI()
+        probe.router.route_class = ProfiledRoute
+
+        def spin(seconds):
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                pass
+
+        @probe.get("/sync")
+        def busy_sync():
+            spin(0.05)
+            return {}
+
+        @probe.get("/async")
+        async def busy_async():
+            spin(0.05)
+            return {}
+
+        store = ProfileStore(str(profile_dir))
+        probe.add_middleware(ProfilingMiddleware, store=store, sample_rate=1.0)
+        with TestClient(probe) as probe_client:
+            for path, endpoint in (("/sync", "busy_sync"), ("/async", "busy_async")):
+                artifact = store.get(probe_client.get(path).headers["x-profile-id"])
+                assert artifact["summary"]["samples"] > 0
+                assert endpoint in artifact["collapsed"]
+
+    def test_artifacts_are_shared_between_workers(self, profile_dir):
+        worker_a = ProfileStore(str(profile_dir), max_artifacts=2)
+        worker_b = ProfileStore(str(profile_dir), max_artifacts=2)
+        profiles = [RequestProfile("GET", f"/{i}", interval=0.001) for i in range(3)]
+        for index, profile in enumerate(profiles):
+            (worker_a if index % 2 else worker_b).add(profile)
+            time.sleep(0.01)
+        assert worker_a.get(profiles[2].id)["summary"]["path"] == "/2"
+        assert [summary["id"] for summary in worker_b.all()] == [profiles[2].id, profiles[1].id]
+        assert worker_a.get(profiles[0].id) is None
+        assert worker_a.get("../../etc/passwd") is None
+
+    def test_query_flag_triggers_profile(self, client, profile_token):
+        response = client.get(f"/health?profile={profile_token}")
+        assert "x-profile-id" in response.headers
+
+    def test_unsigned_trigger_is_ignored(self, client, admin_token):
+        response = client.get("/health", headers={"X-Profile-Token": admin_token})
+        assert "x-profile-id" not in response.headers
+        assert "x-profile-id" not in client.get("/health").headers
+
+    def test_profile_token_is_not_an_access_token(self, client, profile_token):
+        response = client.get("/users/me", headers={"Authorization": f"Bearer {profile_token}"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_profiles_forbidden_regular_user(self, client, auth_token):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        assert client.post("/users/admin/profiles/token", headers=headers).status_code == status.HTTP_403_FORBIDDEN
+        assert client.get("/users/admin/profiles", headers=headers).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_profile_not_found(self, client, admin_token):
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = client.get("/users/admin/profiles/missing", headers=headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+from app.config import Settings, available_cpus
+from app.serve import background_connections, pool_limits, post_fork, server_options, worker_count, worker_environment
+
+class TestServer:
+
+    def test_pool_defaults_without_budget(self):
+        assert pool_limits(Settings(DB_POOL_SIZE=10, DB_MAX_OVERFLOW=20), 4) == (10, 20)
+
+    def test_budget_is_divided_across_workers(self):
+        settings = Settings(DB_CONNECTION_BUDGET=100, DB_POOL_SIZE=10)
+        assert pool_limits(settings, 4) == (11, 14)
+        assert pool_limits(settings, 16) == (6, 0)
+
+    def test_budget_reserves_background_connections(self):
+        assert background_connections(Settings()) == 1
+        cached = Settings(DB_CONNECTION_BUDGET=40, DB_POOL_SIZE=4, USER_CACHE_TTL_SECONDS=30)
+        assert background_connections(cached) == 2
+        assert pool_limits(cached, 4) == (6, 4)
+        with pytest.raises(ValueError):
+            pool_limits(Settings(DB_CONNECTION_BUDGET=8, USER_CACHE_TTL_SECONDS=30), 4)
+
+    def test_budget_too_small(self):
+        with pytest.raises(ValueError):
+            pool_limits(Settings(DB_CONNECTION_BUDGET=3), 4)
+
+    @pytest.fixture
+    def host_cpus(self, monkeypatch):
+        monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(64)))
+
+    def test_cgroup_quota_caps_cpus(self, host_cpus, tmp_path):
+        assert available_cpus(str(tmp_path)) == 64
+        (tmp_path / "cpu.max").write_text("max 100000\n")
+        assert available_cpus(str(tmp_path)) == 64
+        (tmp_path / "cpu.max").write_text("250000 100000\n")
+        assert available_cpus(str(tmp_path)) == 2
+        (tmp_path / "cpu.max").write_text("50000 100000\n")
+        assert available_cpus(str(tmp_path)) == 1
+
+    def test_cgroup_v1_quota_caps_cpus(self, host_cpus, tmp_path):
+        (tmp_path / "cpu").mkdir()
+        (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("400000\n")
+        (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+        assert available_cpus(str(tmp_path)) == 4
+
+    def test_worker_count_fits_the_budget(self, monkeypatch):
+        monkeypatch.setattr("app.serve.available_cpus", lambda: 64)
+        assert worker_count(Settings(WEB_CONCURRENCY=3)) == 3
+        assert worker_count(Settings()) == 64
+        settings = Settings(DB_CONNECTION_BUDGET=80)
+        assert worker_count(settings) == 40
+        pool_limits(settings, worker_count(settings))
+        monkeypatch.setattr("app.serve.available_cpus", lambda: 4)
+        assert worker_count(settings) == 4
+
+    def test_worker_environment(self):
+        environment = worker_environment(Settings(DB_CONNECTION_BUDGET=40, ADMISSION_MAX_CONCURRENCY=2), 4)
+        assert environment == {"DB_POOL_SIZE": "10", "DB_MAX_OVERFLOW": "0"}
+        assert "ADMISSION_MAX_CONCURRENCY" in worker_environment(Settings(), 4)
+
+    def test_server_options(self):
+        options = server_options(Settings(SERVER_PORT=9000), 3)
+        assert options["bind"] == "0.0.0.0:9000"
+        assert options["workers"] == 3
+        assert options["preload_app"]
+        assert options["post_fork"] is post_fork
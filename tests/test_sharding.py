@@ -0,0 +1,248 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from app import crud
+from app.audit import auth_events
+from app.database import Base, DirectoryBase, create_sharded_sessionmaker, get_db
+from app.main import app
+from app.models import User, UserDirectory
+
+class TestSharding:
+
+    @pytest.fixture
+    def sharded(self, tmp_path, monkeypatch):
+        directory = create_engine(f"sqlite:///{tmp_path}/directory.db")
+        shards = {f"shard_{i}": create_engine(f"sqlite:///{tmp_path}/shard_{i}.db") for i in range(3)}
+        DirectoryBase.metadata.create_all(bind=directory)
+        for shard_engine in shards.values():
+            Base.metadata.create_all(bind=shard_engine)
+        factory = create_sharded_sessionmaker(directory, shards)
+
+        def _override_get_db():
+            db = factory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        monkeypatch.setattr(auth_events, "session_factory", factory)
+        monkeypatch.setattr(auth_events, "start", lambda: None)
+        app.dependency_overrides[get_db] = _override_get_db
+        yield TestClient(app), factory, directory, shards
+        auth_events.flush()
+        app.dependency_overrides.clear()
+        for bound in (directory, *shards.values()):
+            bound.dispose()
+
+    @pytest.fixture
+    def register_shard_users(self, sharded):
+        client = sharded[0]
+
+        def _register(count):
+            for i in range(count):
+                response = client.post("/auth/register", json={
+                    "email": f"shard{i}@example.com",
+                    "username": f"shard_user{i}",
+                    "password": "ShardPassword123"
+                })
+                assert response.status_code == 201
+                assert response.json()["id"] == i + 1
+        return _register
+
+    @pytest.fixture
+    def shard_admin_headers(self, sharded):
+        client, factory = sharded[0], sharded[1]
+
+        def _headers():
+            db = factory()
+            db.get(User, 1).is_admin = True
+            db.commit()
+            db.close()
+            response = client.post("/auth/login", json={"username": "shard_user0", "password": "ShardPassword123"})
+            return {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return _headers
+
+    @pytest.fixture
+    def fail_next_commit(self):
+        armed = []
+
+        def _arm(*engines):
+            fired = []
+
+            def _fail(connection):
+                if not fired:
+                    fired.append(connection)
+                    raise RuntimeError("injected commit failure")
+
+            for bound in engines:
+                event.listen(bound, "commit", _fail)
+                armed.append((bound, _fail))
+            return fired
+        yield _arm
+        for bound, listener in armed:
+            event.remove(bound, "commit", listener)
+
+    def _shard_user_count(self, shards, **filters):
+        total = 0
+        for shard_engine in shards.values():
+            with shard_engine.connect() as connection:
+                query = "SELECT COUNT(*) FROM users"
+                if filters:
+                    query += " WHERE " + " AND ".join(f"{column} = :{column}" for column in filters)
+                total += connection.execute(text(query), filters).scalar()
+        return total
+
+    def test_users_are_spread_across_shards(self, sharded, register_shard_users):
+        _, factory, _, shards = sharded
+        register_shard_users(9)
+        counts = {}
+        for shard_id, shard_engine in shards.items():
+            with shard_engine.connect() as connection:
+                counts[shard_id] = connection.execute(text("SELECT COUNT(*) FROM users")).scalar()
+        assert sum(counts.values()) == 9
+        assert sum(1 for count in counts.values() if count) > 1
+
+        db = factory()
+        assert db.query(UserDirectory).count() == 9
+        for user_id in range(1, 10):
+            assert db.get(User, user_id).username == f"shard_user{user_id - 1}"
+        db.close()
+
+    def test_duplicate_username_uses_directory(self, sharded, register_shard_users):
+        client = sharded[0]
+        register_shard_users(1)
+        response = client.post("/auth/register", json={
+            "email": "other@example.com",
+            "username": "shard_user0",
+            "password": "ShardPassword123"
+        })
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_login_refresh_and_me(self, sharded, register_shard_users):
+        client, factory, _, _ = sharded
+        register_shard_users(4)
+        login = client.post("/auth/login", json={"username": "shard2@example.com", "password": "ShardPassword123"})
+        assert login.status_code == status.HTTP_200_OK
+        tokens = login.json()
+        assert tokens["refresh_token"].startswith(factory().shard_for_user(3) + ".")
+
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        me = client.get("/users/me", headers=headers)
+        assert me.json()["username"] == "shard_user2"
+        assert len(client.get("/users/me/sessions", headers=headers).json()) == 1
+
+        refresh = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert refresh.status_code == status.HTTP_200_OK
+        reuse = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert reuse.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_admin_listing_scatter_gather(self, sharded, register_shard_users, shard_admin_headers):
+        client = sharded[0]
+        register_shard_users(8)
+        headers = shard_admin_headers()
+        response = client.get("/users/admin/users?skip=2&limit=4", headers=headers)
+        assert [user["id"] for user in response.json()] == [3, 4, 5, 6]
+        response = client.get("/users/admin/users/search?q=shard_user&skip=6", headers=headers)
+        assert [user["id"] for user in response.json()] == [7, 8]
+
+    def test_admin_delete_and_bulk_update(self, sharded, register_shard_users, shard_admin_headers):
+        client = sharded[0]
+        register_shard_users(6)
+        headers = shard_admin_headers()
+        assert client.delete("/users/admin/users/2", headers=headers).status_code == status.HTTP_200_OK
+        login = client.post("/auth/login", json={"username": "shard_user1", "password": "ShardPassword123"})
+        assert login.status_code == status.HTTP_401_UNAUTHORIZED
+
+        response = client.post("/users/admin/users/bulk", json={"action": "delete", "user_ids": [3, 4]}, headers=headers)
+        assert response.json()["affected"] == 2
+        response = client.post("/users/admin/users/bulk", json={
+            "action": "deactivate",
+            "filter": {"q": "shard_user"}
+        }, headers=headers)
+        assert response.json()["affected"] == 2
+        listed = client.get("/users/admin/users", headers=headers).json()
+        assert [(user["id"], user["is_active"]) for user in listed] == [(1, True), (5, False), (6, False)]
+        reuse = client.post("/auth/register", json={
+            "email": "shard2@example.com",
+            "username": "shard_user2",
+            "password": "ShardPassword123"
+        })
+        assert reuse.status_code == status.HTTP_201_CREATED
+
+    @pytest.mark.parametrize("failing", ["directory", "shards"])
+    def test_failed_create_leaves_no_rows(self, sharded, fail_next_commit, failing):
+        client, factory, directory, shards = sharded
+        fired = fail_next_commit(*([directory] if failing == "directory" else shards.values()))
+        payload = {"email": "ghost@example.com", "username": "ghost", "password": "ShardPassword123"}
+        with pytest.raises(RuntimeError):
+            client.post("/auth/register", json=payload)
+        assert fired
+
+        db = factory()
+        assert db.query(UserDirectory).count() == 0
+        db.close()
+        assert self._shard_user_count(shards) == 0
+        assert client.post("/auth/register", json=payload).status_code == status.HTTP_201_CREATED
+
+    def test_orphaned_directory_row_is_free(self, sharded):
+        client, factory, _, _ = sharded
+        db = factory()
+        db.add(UserDirectory(id=99, email="ghost@example.com", username="ghost"))
+        db.commit()
+        db.close()
+        login = client.post("/auth/login", json={"username": "ghost", "password": "ShardPassword123"})
+        assert login.status_code == status.HTTP_401_UNAUTHORIZED
+        response = client.post("/auth/register", json={
+            "email": "ghost@example.com",
+            "username": "ghost",
+            "password": "ShardPassword123"
+        })
+        assert response.status_code == status.HTTP_201_CREATED
+        login = client.post("/auth/login", json={"username": "ghost", "password": "ShardPassword123"})
+        assert login.status_code == status.HTTP_200_OK
+
+        db = factory()
+        assert db.get(UserDirectory, response.json()["id"]).pending_since is None
+        db.close()
+
+    def test_pending_directory_row_is_kept_until_stale(self, sharded):
+        client, factory, _, _ = sharded
+        payload = {"email": "racer@example.com", "username": "racer", "password": "ShardPassword123"}
+        db = factory()
+        db.add(UserDirectory(id=99, email="racer@example.com", username="racer", pending_since=datetime.now(timezone.utc)))
+        db.commit()
+        db.close()
+        response = client.post("/auth/register", json=payload)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        db = factory()
+        entry = db.get(UserDirectory, 99)
+        assert entry is not None
+        entry.pending_since = datetime.now(timezone.utc) - timedelta(seconds=crud.settings.directory_pending_grace_seconds + 1)
+        db.commit()
+        db.close()
+        response = client.post("/auth/register", json=payload)
+        assert response.status_code == status.HTTP_201_CREATED
+
+    @pytest.mark.parametrize("failing", ["directory", "shards"])
+    def test_failed_delete_keeps_directory_consistent(
+        self, sharded, register_shard_users, shard_admin_headers, fail_next_commit, failing
+    ):
+        client, factory, directory, shards = sharded
+        register_shard_users(3)
+        headers = shard_admin_headers()
+        fired = fail_next_commit(*([directory] if failing == "directory" else shards.values()))
+        with pytest.raises(RuntimeError):
+            client.post("/users/admin/users/bulk", json={"action": "delete", "user_ids": [2, 3]}, headers=headers)
+        assert fired
+
+        db = factory()
+        entries = {entry.id for entry in db.query(UserDirectory)}
+        db.close()
+        for user_id in (2, 3):
+            assert (user_id in entries) == bool(self._shard_user_count(shards, id=user_id))
+        for i in (1, 2):
+            login = client.post("/auth/login", json={"username": f"shard_user{i}", "password": "ShardPassword123"})
+            assert login.status_code == (status.HTTP_200_OK if i + 1 in entries else status.HTTP_401_UNAUTHORIZED)
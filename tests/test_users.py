@@ -1,7 +1,13 @@
+import time
+
 import pytest
 from fastapi import status
+from sqlalchemy import event, text
+from app.cache import INVALIDATION_CHANNEL, InvalidationListener, UserCache, user_cache
 from app.auth import get_password_hash
-from app.models import User
+from app.crud import get_principal
+from app.models import RefreshToken, User
+from app.principal import Principal
 
 class TestUserProfile:
     
@@ -105,6 +111,386 @@ class TestAdminEndpoints:
         assert response.status_code == status.HTTP_403_FORBIDDEN
 
 
+class TestUserSearch:
+
+    @pytest.fixture
+    def admin_search(self, client, admin_token):
+        def _search(**params):
+            headers = {"Authorization": f"Bearer {admin_token}"}
+            response = client.get("/users/admin/users/search", params=params, headers=headers)
+            assert response.status_code == status.HTTP_200_OK
+            return sorted(u["username"] for u in response.json())
+        return _search
+
+    @pytest.fixture
+    def search_users(self, db_session):
+        users = [
+            User(email="alice.smith@example.com", username="alice_s", full_name="Alice Smith",
+                 hashed_password="x", is_active=True, is_admin=False),
+            User(email="bob@corp.example.com", username="bobby", full_name="Bob Alison",
+                 hashed_password="x", is_active=False, is_admin=False),
+            User(email="carol@example.com", username="carol_100", full_name="Carol",
+                 hashed_password="x", is_active=True, is_admin=True),
+        ]
+        db_session.add_all(users)
+        db_session.flush()
+        return users
+
+    def test_prefix_match_is_case_insensitive(self, admin_search, search_users):
+        assert admin_search(q="ALI") == ["alice_s"]
+
+    def test_contains_match_across_fields(self, admin_search, search_users):
+        assert admin_search(q="ali", match="contains") == ["alice_s", "bobby"]
+        assert admin_search(q="corp", match="contains") == ["bobby"]
+
+    def test_wildcards_are_escaped(self, admin_search, search_users):
+        assert admin_search(q="carol_1") == ["carol_100"]
+        assert admin_search(q="%") == []
+
+    def test_flag_filters(self, admin_search, search_users):
+        assert admin_search(is_active=False) == ["bobby"]
+        assert "carol_100" in admin_search(is_admin=True)
+        assert "alice_s" not in admin_search(is_admin=True)
+
+    def test_created_range_filter(self, admin_search, search_users):
+        assert admin_search(q="carol", created_to="2000-01-01T00:00:00Z") == []
+        assert admin_search(q="carol", created_from="2000-01-01T00:00:00Z") == ["carol_100"]
+
+    def test_search_forbidden_regular_user(self, client, auth_token):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.get("/users/admin/users/search?q=a", headers=headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestBulkOperations:
+
+    @pytest.fixture
+    def admin_bulk(self, client, admin_token):
+        def _bulk(payload):
+            headers = {"Authorization": f"Bearer {admin_token}"}
+            return client.post("/users/admin/users/bulk", json=payload, headers=headers)
+        return _bulk
+
+    @pytest.fixture
+    def bulk_users(self, db_session):
+        users = [
+            User(email=f"bulk{i}@example.com", username=f"bulk_{i}", hashed_password="x",
+                 is_active=True, is_admin=False)
+            for i in range(3)
+        ]
+        db_session.add_all(users)
+        db_session.flush()
+        return users
+
+    def test_deactivate_by_ids(self, admin_bulk, admin_user, bulk_users, db_session):
+        ids = [u.id for u in bulk_users[:2]]
+        response = admin_bulk({
+            "action": "deactivate",
+            "user_ids": ids + [99999, admin_user.id]
+        })
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["affected"] == 2
+        statuses = {r["id"]: r["status"] for r in data["results"]}
+        assert statuses == {ids[0]: "updated", ids[1]: "updated", 99999: "not_found", admin_user.id: "skipped_self"}
+        db_session.expire_all()
+        assert [u.is_active for u in bulk_users] == [False, False, True]
+        assert db_session.get(User, admin_user.id).is_active
+
+    def test_delete_revokes_sessions(self, client, admin_bulk, test_user, db_session, login):
+        tokens = login()
+        user_id = test_user.id
+        response = admin_bulk({"action": "delete", "user_ids": [user_id]})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["results"] == [{"id": user_id, "status": "deleted"}]
+        db_session.expire_all()
+        assert db_session.get(User, user_id) is None
+        assert db_session.query(RefreshToken).filter(
+            RefreshToken.user_id == user_id,
+            RefreshToken.is_revoked == False
+        ).count() == 0
+        refresh = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert refresh.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_set_admin_by_filter_skips_caller(self, admin_bulk, admin_user, bulk_users, db_session):
+        response = admin_bulk({"action": "unset_admin", "filter": {"is_admin": True}})
+        assert response.status_code == status.HTTP_200_OK
+        assert admin_user.id not in [r["id"] for r in response.json()["results"]]
+        response = admin_bulk({"action": "set_admin", "filter": {"q": "bulk_"}})
+        assert response.json()["affected"] == 3
+        db_session.expire_all()
+        assert all(u.is_admin for u in bulk_users)
+
+    def test_requires_exactly_one_target(self, admin_bulk):
+        assert admin_bulk({"action": "activate"}).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        response = admin_bulk({"action": "activate", "user_ids": [1], "filter": {}})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_empty_filter_rejected(self, admin_bulk, bulk_users, db_session):
+        for empty in ({}, {"q": ""}, {"match": "contains"}):
+            response = admin_bulk({"action": "delete", "filter": empty})
+            assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        db_session.expire_all()
+        assert all(db_session.get(User, u.id) is not None for u in bulk_users)
+
+    def test_bulk_forbidden_regular_user(self, client, auth_token):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.post("/users/admin/users/bulk", json={"action": "delete", "user_ids": [1]}, headers=headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestPasswordChange:
+
+    def test_change_password(self, client, test_user):
+        login = client.post("/auth/login", json={"username": "testuser", "password": "TestPassword123"}).json()
+        headers = {"Authorization": f"Bearer {login['access_token']}"}
+        response = client.put("/users/me/password", json={
+            "current_password": "TestPassword123",
+            "new_password": "ChangedPassword456"
+        }, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["revoked"] == 1
+
+        refresh = client.post("/auth/refresh", json={"refresh_token": login["refresh_token"]})
+        assert refresh.status_code == status.HTTP_401_UNAUTHORIZED
+        old = client.post("/auth/login", json={"username": "testuser", "password": "TestPassword123"})
+        assert old.status_code == status.HTTP_401_UNAUTHORIZED
+        new = client.post("/auth/login", json={"username": "testuser", "password": "ChangedPassword456"})
+        assert new.status_code == status.HTTP_200_OK
+
+    def test_wrong_current_password(self, client, auth_token):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.put("/users/me/password", json={
+            "current_password": "WrongPassword123",
+            "new_password": "ChangedPassword456"
+        }, headers=headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_same_password_rejected(self, client, auth_token):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.put("/users/me/password", json={
+            "current_password": "TestPassword123",
+            "new_password": "TestPassword123"
+        }, headers=headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_weak_new_password(self, client, auth_token):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.put("/users/me/password", json={
+            "current_password": "TestPassword123",
+            "new_password": "weak"
+        }, headers=headers)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_breached_new_password(self, client, auth_token, breached):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.put("/users/me/password", json={
+            "current_password": "TestPassword123",
+            "new_password": "Summer2024"
+        }, headers=headers)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert "data breach" in response.text
+
+
+class TestSessions:
+
+    def test_list_sessions(self, client, login):
+        login()
+        tokens = login()
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        response = client.get("/users/me/sessions", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert len(data) == 2
+        assert {"id", "created_at", "expires_at"} <= set(data[0])
+
+    def test_revoke_all_sessions(self, client, login):
+        first = login()
+        second = login()
+        headers = {"Authorization": f"Bearer {second['access_token']}"}
+        response = client.delete("/users/me/sessions", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["revoked"] == 2
+        for tokens in (first, second):
+            refresh = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+            assert refresh.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_revoke_single_session(self, client, login):
+        first = login()
+        second = login()
+        headers = {"Authorization": f"Bearer {second['access_token']}"}
+        sessions = client.get("/users/me/sessions", headers=headers).json()
+        response = client.delete(f"/users/me/sessions/{sessions[-1]['id']}", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert client.post("/auth/refresh", json={"refresh_token": first["refresh_token"]}).status_code == status.HTTP_401_UNAUTHORIZED
+        assert client.post("/auth/refresh", json={"refresh_token": second["refresh_token"]}).status_code == status.HTTP_200_OK
+
+    def test_revoke_session_not_found(self, client, auth_token):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.delete("/users/me/sessions/99999", headers=headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_admin_revoke_user_sessions(self, client, admin_token, test_user, login):
+        tokens = login()
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = client.delete(f"/users/admin/users/{test_user.id}/sessions", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["revoked"] == 1
+        refresh = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert refresh.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_admin_revoke_sessions_forbidden_regular_user(self, client, auth_token, admin_user):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.delete(f"/users/admin/users/{admin_user.id}/sessions", headers=headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_delete_user_revokes_sessions(self, client, admin_token, test_user, db_session, login):
+        login()
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = client.delete(f"/users/admin/users/{test_user.id}", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        active = db_session.query(RefreshToken).filter(
+            RefreshToken.user_id == test_user.id,
+            RefreshToken.is_revoked == False
+        ).count()
+        assert active == 0
+
+
+class TestPrincipal:
+
+    def test_principal_is_immutable_and_slotted(self):
+        principal = Principal(1, "alice", True, False)
+        with pytest.raises(AttributeError):
+            principal.is_admin = True
+        assert not hasattr(principal, "__dict__")
+        assert principal == Principal(1, "alice", True, False)
+
+    def test_get_principal_loads_only_auth_columns(self, db_session, test_user):
+        principal = get_principal(db_session, test_user.id)
+        assert principal == Principal(test_user.id, "testuser", True, False)
+        assert get_principal(db_session, 99999) is None
+
+    @pytest.mark.parametrize("method, path, body", [
+        ("GET", "/users/me", None),
+        ("PUT", "/users/me/password", {"current_password": "wrong", "new_password": "NewPassword456"}),
+    ])
+    def test_entity_endpoints_load_user_once(self, client, auth_token, db_engine, method, path, body):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if "FROM users" in statement:
+                statements.append(statement)
+
+        event.listen(db_engine, "before_cursor_execute", record)
+        try:
+            client.request(method, path, json=body, headers={"Authorization": f"Bearer {auth_token}"})
+        finally:
+            event.remove(db_engine, "before_cursor_execute", record)
+        assert len(statements) == 1
+
+
+class TestUserCache:
+
+    @pytest.fixture
+    def enabled_cache(self, monkeypatch):
+        monkeypatch.setattr(user_cache, "ttl", 60)
+        user_cache.clear()
+        yield user_cache
+        user_cache.clear()
+
+    def test_staleness_bound_while_disconnected(self):
+        cache = UserCache(ttl=60, max_staleness=0.05, max_size=10)
+        cache.set(1, "cached")
+        assert cache.get(1) == "cached"
+        time.sleep(0.1)
+        assert cache.get(1) is None
+        cache.mark_connected("shard_0")
+        cache.set(1, "cached")
+        time.sleep(0.1)
+        assert cache.get(1) == "cached"
+
+    def test_staleness_bound_while_any_listener_disconnected(self):
+        cache = UserCache(ttl=60, max_staleness=0.05, max_size=10)
+        cache.mark_connected("shard_0")
+        cache.mark_connected("shard_1")
+        cache.mark_disconnected("shard_1")
+        cache.mark_disconnected("shard_1")
+        cache.mark_connected("shard_0")
+        assert not cache.metrics()["listener_connected"]
+        assert cache.metrics()["listeners_disconnected"] == 1
+        cache.set(1, "cached")
+        time.sleep(0.1)
+        assert cache.get(1) is None
+        cache.mark_connected("shard_1")
+        cache.set(1, "cached")
+        time.sleep(0.1)
+        assert cache.get(1) == "cached"
+
+    def test_started_listener_counts_as_disconnected_until_listening(self):
+        cache = UserCache(ttl=60, max_staleness=60, max_size=10)
+        cache.mark_connected("shard_0")
+        cache.mark_disconnected("shard_1")
+        assert not cache.metrics()["listener_connected"]
+
+    def test_reconnect_clears_entries(self):
+        cache = UserCache(ttl=60, max_staleness=60, max_size=10)
+        cache.set(1, "cached")
+        cache.mark_connected("shard_0")
+        assert cache.get(1) is None
+
+    def test_max_size_evicts_least_recently_used(self):
+        cache = UserCache(ttl=60, max_staleness=60, max_size=2)
+        cache.set(1, "a")
+        cache.set(2, "b")
+        cache.get(1)
+        cache.set(3, "c")
+        assert cache.get(2) is None
+        assert cache.get(1) == "a"
+
+    def test_listener_evicts_on_notify(self, db_engine):
+        cache = UserCache(ttl=60, max_staleness=60, max_size=10)
+        listener = InvalidationListener(db_engine, cache)
+        listener.start()
+        try:
+            deadline = time.monotonic() + 5
+            while not cache.metrics()["listener_connected"] and time.monotonic() < deadline:
+                time.sleep(0.01)
+            cache.set(42, "cached")
+            with db_engine.connect() as connection:
+                connection.execute(text("SELECT pg_notify(:c, 'user:42')"), {"c": INVALIDATION_CHANNEL})
+                connection.commit()
+            while cache.get(42) is not None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert cache.get(42) is None
+        finally:
+            listener.stop()
+
+    def test_current_user_served_from_cache(self, client, auth_token, test_user, enabled_cache):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        assert client.get("/users/me/sessions", headers=headers).status_code == status.HTTP_200_OK
+        hits = enabled_cache.metrics()["hits"]
+        assert client.get("/users/me/sessions", headers=headers).status_code == status.HTTP_200_OK
+        assert enabled_cache.metrics()["hits"] == hits + 1
+        assert enabled_cache.get(test_user.id).username == "testuser"
+
+    def test_deactivation_evicts_cached_principal(self, client, auth_token, admin_token, test_user, enabled_cache):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        assert client.get("/users/me/sessions", headers=headers).status_code == status.HTTP_200_OK
+        response = client.post("/users/admin/users/bulk", json={
+            "action": "deactivate",
+            "user_ids": [test_user.id]
+        }, headers={"Authorization": f"Bearer {admin_token}"})
+        assert response.json()["affected"] == 1
+        assert client.get("/users/me/sessions", headers=headers).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_deletion_evicts_cached_principal(self, client, auth_token, admin_token, test_user, enabled_cache):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        assert client.get("/users/me/sessions", headers=headers).status_code == status.HTTP_200_OK
+        response = client.delete(f"/users/admin/users/{test_user.id}", headers={"Authorization": f"Bearer {admin_token}"})
+        assert response.status_code == status.HTTP_200_OK
+        assert client.get("/users/me/sessions", headers=headers).status_code == status.HTTP_401_UNAUTHORIZED
+
+
 class TestHealthAndRoot:
     
     def test_health_check(self, client):